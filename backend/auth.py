@@ -1,8 +1,12 @@
 """
 Authentication utilities and password handling
 """
+import asyncio
 import os
 import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -16,12 +20,20 @@ except ImportError:
     JWTError = Exception
     jwt = None
 
+from cache import TTLCache
+
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
+# Decoded token -> claims; entries never outlive the token's own exp
+_token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")),
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     if not pwd_context:
@@ -34,6 +46,50 @@ def get_password_hash(password: str) -> str:
         return password  # Fallback for development
     return pwd_context.hash(password)
 
+# bcrypt costs ~250ms of CPU, so it runs on a small dedicated pool instead of the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_lock = threading.Lock()
+_hash_pending = 0
+_hash_rejected = 0
+
+class PasswordPoolSaturated(Exception):
+    """Raised when too many hash/verify operations are already queued"""
+
+async def _run_password_op(fn, *args):
+    global _hash_pending, _hash_rejected
+    with _hash_lock:
+        if _hash_pending >= PASSWORD_HASH_MAX_PENDING:
+            _hash_rejected += 1
+            raise PasswordPoolSaturated()
+        _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, fn, *args)
+    finally:
+        with _hash_lock:
+            _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool"""
+    return await _run_password_op(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await _run_password_op(get_password_hash, password)
+
+def password_pool_stats() -> dict:
+    """Snapshot of the hashing pool for monitoring"""
+    pending = _hash_pending
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "in_flight": min(pending, PASSWORD_HASH_WORKERS),
+        "queue_depth": max(0, pending - PASSWORD_HASH_WORKERS),
+        "rejected_total": _hash_rejected,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     if not jwt:
@@ -71,6 +127,22 @@ def verify_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+def verify_token_cached(token: str) -> Optional[dict]:
+    """Verify a JWT, reusing previously decoded claims until they expire"""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = verify_token(token)
+    if payload is None:
+        return None
+    ttl = _token_cache.ttl
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        _token_cache.set(token, payload, ttl)
+    return payload
+
 def generate_session_token() -> str:
     """Generate secure session token"""
     return secrets.token_urlsafe(32)
\ No newline at end of file
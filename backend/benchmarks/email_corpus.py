@@ -0,0 +1,94 @@
+"""
+Deterministic synthetic email corpus for parser benchmarks.
+
+Kinds: plain text, HTML newsletters, multipart/alternative, messages with
+large attachments, and RFC 2047 encoded headers in a range of charsets.
+"""
+import random
+from email.header import Header
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+KINDS = ("plain", "html", "alternative", "attachment", "encoded_headers")
+
+_WORDS = ("meeting report budget invoice launch release deadline review update customer "
+          "project roadmap design sprint metrics team quarter plan draft feedback").split()
+
+_ENCODED_SUBJECTS = [
+    ("Réunion budgétaire : prochaines étapes", "iso-8859-1"),
+    ("Überprüfung des Angebots", "iso-8859-15"),
+    ("Встреча по проекту завтра", "koi8-r"),
+    ("プロジェクトの進捗について", "iso-2022-jp"),
+    ("项目进度更新", "gb2312"),
+    ("회의 일정 변경 안내", "euc-kr"),
+    ("Ελέγχος προϋπολογισμού", "iso-8859-7"),
+    ("Emoji status ✅ deployed 🚀", "utf-8"),
+]
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, count: int) -> List[str]:
+    return [" ".join(_sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(2, 5))) for _ in range(count)]
+
+
+def _newsletter_html(rng: random.Random) -> str:
+    items = "".join(
+        f"<tr><td style='padding:8px'><h2>{_sentence(rng, 4)}</h2><p>{p}</p>"
+        f"<a href='https://news.example.com/track?id={rng.randint(0, 10**9)}'>Read more</a></td></tr>"
+        for p in _paragraphs(rng, 8)
+    )
+    return (
+        "<html><head><style>body{font-family:Arial} td{color:#333}</style>"
+        "<script>var t='tracking';</script></head><body><table width='600'>"
+        f"{items}</table><div>Unsubscribe &amp; manage preferences</div><br></body></html>"
+    )
+
+
+def _base(rng: random.Random, i: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = f"Sender {i % 13} <sender{i % 13}@example.com>"
+    msg["To"] = "you@example.com"
+    msg["Subject"] = _sentence(rng, 5)
+    msg["Date"] = format_datetime(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i))
+    msg["Message-ID"] = f"<bench-{i}@example.com>"
+    return msg
+
+
+def make_message(kind: str, i: int, seed: int = 1234) -> bytes:
+    rng = random.Random(seed * 1000003 + i)
+    msg = _base(rng, i)
+    if kind == "plain":
+        msg.set_content("\n\n".join(_paragraphs(rng, 6)))
+    elif kind == "html":
+        msg.set_content(_newsletter_html(rng), subtype="html")
+    elif kind == "alternative":
+        paras = _paragraphs(rng, 5)
+        msg.set_content("\n\n".join(paras))
+        msg.add_alternative("<html><body>" + "".join(f"<p>{p}</p>" for p in paras) + "</body></html>", subtype="html")
+    elif kind == "attachment":
+        msg.set_content("\n\n".join(_paragraphs(rng, 2)))
+        size = rng.choice((256, 1024, 4096)) * 1024
+        msg.add_attachment(rng.randbytes(size), maintype="application", subtype="pdf", filename=f"report-{i}.pdf")
+    elif kind == "encoded_headers":
+        text, charset = _ENCODED_SUBJECTS[i % len(_ENCODED_SUBJECTS)]
+        del msg["Subject"], msg["From"]
+        msg.set_content("\n\n".join(_paragraphs(rng, 3)), charset="utf-8")
+        # Prepend raw RFC 2047 headers; assigning them via EmailMessage would re-encode as UTF-8
+        headers = (
+            f"Subject: {Header(text, charset).encode()}\n"
+            f"From: {Header('Zoë Ñúñez', 'iso-8859-1').encode()} <zoe@example.com>\n"
+        )
+        return headers.encode("ascii") + msg.as_bytes()
+    else:
+        raise ValueError(f"Unknown corpus kind: {kind}")
+    return msg.as_bytes()
+
+
+def build_corpus(per_kind: int = 50, seed: int = 1234) -> Dict[str, List[bytes]]:
+    """Return ``{kind: [raw message bytes, ...]}`` for every kind."""
+    return {kind: [make_message(kind, i, seed) for i in range(per_kind)] for kind in KINDS}
@@ -0,0 +1,246 @@
+"""
+Local stand-in for the Gmail REST API and Google's OAuth token endpoint.
+
+Implements what ``GmailClient`` uses: ``users.getProfile``,
+``users.messages.list``, ``users.messages.get`` (``format=metadata`` /
+``minimal``), ``users.history.list`` and the ``/batch/gmail/v1`` multipart
+endpoint, plus ``POST /token`` for refresh-token grants. Any bearer token
+is accepted unless ``expired_tokens`` lists it. New mail can be injected
+with ``GmailStubState.add_message`` to exercise incremental syncs.
+
+    python -m benchmarks.gmail_stub --port 8090 --messages 200
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+_MESSAGE_RE = re.compile(r"^/gmail/v1/users/me/messages/([^/?]+)$")
+
+
+class GmailStubState:
+    """In-memory mailbox with a history log and per-endpoint request counters."""
+
+    def __init__(self, messages: int = 50, email_address: str = "you@example.com", history_retention: int = 10000):
+        self.email_address = email_address
+        self.history_id = 1000
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []  # newest first, like messages.list
+        self.history: List[Tuple[int, str]] = []  # (history id, message id added)
+        # startHistoryId values older than this answer 404, as Gmail does after ~a week
+        self.history_floor = 0
+        self.history_retention = history_retention
+        self.expired_tokens: set = set()
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        now = datetime.now(timezone.utc)
+        for i in range(messages):
+            self.add_message(
+                f"Weekly report #{i}", f"Sender {i % 7} <sender{i % 7}@example.com>",
+                f"This is stub message {i}.", now - timedelta(minutes=messages - i),
+            )
+
+    def add_message(self, subject: str, sender: str, body: str = "", when: Optional[datetime] = None) -> str:
+        with self.lock:
+            self.history_id += 1
+            msg_id = uuid.uuid4().hex[:16]
+            when = when or datetime.now(timezone.utc)
+            self.messages[msg_id] = {
+                "id": msg_id, "threadId": msg_id, "labelIds": ["INBOX", "UNREAD"],
+                "snippet": body[:200], "historyId": str(self.history_id),
+                "internalDate": str(int(when.timestamp() * 1000)), "sizeEstimate": 1024 + len(body),
+                "headers": [
+                    {"name": "From", "value": sender},
+                    {"name": "To", "value": self.email_address},
+                    {"name": "Subject", "value": subject},
+                    {"name": "Date", "value": format_datetime(when)},
+                    {"name": "Message-ID", "value": f"<{msg_id}@stub.example.com>"},
+                ],
+            }
+            self.order.insert(0, msg_id)
+            self.history.append((self.history_id, msg_id))
+            if len(self.history) > self.history_retention:
+                dropped = self.history.pop(0)
+                self.history_floor = dropped[0]
+            return msg_id
+
+    def count(self, endpoint: str) -> None:
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def render_message(self, msg_id: str, fmt: str, headers: List[str]) -> Optional[Dict[str, Any]]:
+        msg = self.messages.get(msg_id)
+        if msg is None:
+            return None
+        out = {k: v for k, v in msg.items() if k != "headers"}
+        if fmt != "minimal":
+            wanted = {h.lower() for h in headers}
+            out["payload"] = {
+                "mimeType": "text/plain",
+                "headers": [h for h in msg["headers"] if not wanted or h["name"].lower() in wanted],
+            }
+        return out
+
+
+def _route(state: GmailStubState, method: str, target: str) -> Tuple[int, Dict[str, Any]]:
+    """Handle one (possibly batched) API call; returns status and JSON body."""
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    one = lambda name, default=None: (query.get(name) or [default])[0]
+    path = url.path
+    if method == "GET" and path == "/gmail/v1/users/me/profile":
+        state.count("profile")
+        return 200, {"emailAddress": state.email_address, "messagesTotal": len(state.messages),
+                     "threadsTotal": len(state.messages), "historyId": str(state.history_id)}
+    if method == "GET" and path == "/gmail/v1/users/me/messages":
+        state.count("messages.list")
+        limit = min(int(one("maxResults", "100")), 500)
+        start = int(one("pageToken", "0"))
+        ids = state.order[start:start + limit]
+        body: Dict[str, Any] = {"messages": [{"id": i, "threadId": i} for i in ids], "resultSizeEstimate": len(ids)}
+        if start + limit < len(state.order):
+            body["nextPageToken"] = str(start + limit)
+        return 200, body
+    if method == "GET" and path == "/gmail/v1/users/me/history":
+        state.count("history.list")
+        start_id = int(one("startHistoryId", "0"))
+        if start_id < state.history_floor:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found.", "status": "NOT_FOUND"}}
+        limit = min(int(one("maxResults", "100")), 500)
+        offset = int(one("pageToken", "0"))
+        entries = [(h, m) for h, m in state.history if h > start_id][offset:offset + limit]
+        body = {"historyId": str(state.history_id)}
+        if entries:
+            body["history"] = [{"id": str(h), "messagesAdded": [{"message": {"id": m, "threadId": m, "labelIds": ["INBOX"]}}]}
+                               for h, m in entries]
+        if len(entries) == limit:
+            body["nextPageToken"] = str(offset + limit)
+        return 200, body
+    match = _MESSAGE_RE.match(path)
+    if method == "GET" and match:
+        state.count("messages.get")
+        msg = state.render_message(match.group(1), one("format", "full"), query.get("metadataHeaders", []))
+        if msg is None:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found.", "status": "NOT_FOUND"}}
+        return 200, msg
+    return 404, {"error": {"code": 404, "message": f"unknown path {path}"}}
+
+
+def _split_batch(body: bytes, boundary: str) -> List[Tuple[str, str, str]]:
+    """Parts of a batch request as (content id, method, target)."""
+    parts = []
+    for chunk in body.decode("utf-8").split(f"--{boundary}"):
+        chunk = chunk.strip()
+        if not chunk or chunk == "--":
+            continue
+        content_id = ""
+        for line in chunk.splitlines():
+            if line.lower().startswith("content-id:"):
+                content_id = line.split(":", 1)[1].strip()
+            request_line = re.match(r"^(GET|POST|DELETE|PATCH|PUT) (\S+)", line)
+            if request_line:
+                parts.append((content_id, request_line.group(1), request_line.group(2)))
+                break
+    return parts
+
+
+def _make_handler(state: GmailStubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self) -> bool:
+            token = (self.headers.get("Authorization") or "").partition("Bearer ")[2]
+            if token and token not in state.expired_tokens:
+                return True
+            self._send(401, json.dumps({"error": {"code": 401, "message": "Invalid Credentials", "status": "UNAUTHENTICATED"}}).encode())
+            return False
+
+        def do_GET(self):
+            if not self._authorized():
+                return
+            status, payload = _route(state, "GET", self.path)
+            self._send(status, json.dumps(payload).encode("utf-8"))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            if self.path == "/token":
+                state.count("token")
+                form = parse_qs(body.decode("utf-8"))
+                if (form.get("grant_type") or [""])[0] != "refresh_token" or not form.get("refresh_token"):
+                    self._send(400, json.dumps({"error": "invalid_grant"}).encode())
+                    return
+                self._send(200, json.dumps({"access_token": f"stub-{uuid.uuid4().hex}", "expires_in": 3599,
+                                            "token_type": "Bearer", "scope": "https://www.googleapis.com/auth/gmail.readonly"}).encode())
+                return
+            if self.path != "/batch/gmail/v1":
+                self._send(404, json.dumps({"error": {"code": 404, "message": f"unknown path {self.path}"}}).encode())
+                return
+            if not self._authorized():
+                return
+            state.count("batch")
+            boundary = (self.headers.get("Content-Type") or "").partition("boundary=")[2].strip('"')
+            out_boundary = f"batch_{uuid.uuid4().hex}"
+            chunks = []
+            for content_id, method, target in _split_batch(body, boundary):
+                status, payload = _route(state, method, target)
+                response_id = f"<response-{content_id.strip('<>')}>" if content_id else ""
+                chunks.append(
+                    f"--{out_boundary}\r\nContent-Type: application/http\r\nContent-ID: {response_id}\r\n\r\n"
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+                )
+            chunks.append(f"--{out_boundary}--\r\n")
+            self._send(200, "".join(chunks).encode("utf-8"), f"multipart/mixed; boundary={out_boundary}")
+
+    return Handler
+
+
+def start_gmail_stub(host: str = "127.0.0.1", port: int = 0, state: Optional[GmailStubState] = None) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; the bound port is ``server.server_address[1]``."""
+    server = ThreadingHTTPServer((host, port), _make_handler(state or GmailStubState()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gmail-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--messages", type=int, default=50, help="Messages in the initial mailbox")
+    parser.add_argument("--new-every", type=float, default=0.0, help="Add a message every N seconds (0 = never)")
+    args = parser.parse_args()
+    state = GmailStubState(args.messages)
+    server = start_gmail_stub(args.host, args.port, state)
+    print(f"Gmail stub on http://{args.host}:{server.server_address[1]} (GMAIL_API_BASE / GOOGLE_TOKEN_URI=.../token)")
+    try:
+        while True:
+            if args.new_every > 0:
+                time.sleep(args.new_every)
+                state.add_message("New stub message", "Stub <stub@example.com>", "Fresh mail for incremental sync.")
+            else:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Minimal plaintext IMAP4rev1 server for benchmarks.
+
+Implements just what ``EmailService`` uses (CAPABILITY, LOGIN, SELECT/EXAMINE,
+SEARCH ALL, FETCH n (RFC822), NOOP, LOGOUT). Any username/password is
+accepted. Messages are loaded from an mbox file, or synthesised if none is given.
+
+    python -m benchmarks.imap_stub --port 1143 --mbox ~/mail/archive.mbox
+"""
+import argparse
+import mailbox
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+
+def synthetic_corpus(count: int = 50) -> List[bytes]:
+    now = datetime.now(timezone.utc)
+    messages = []
+    for i in range(count):
+        msg = EmailMessage()
+        msg["From"] = f"Sender {i % 7} <sender{i % 7}@example.com>"
+        msg["To"] = "you@example.com"
+        msg["Subject"] = ["Weekly report", "URGENT: server down", "FYI: newsletter", "Lunch?"][i % 4] + f" #{i}"
+        msg["Date"] = format_datetime(now - timedelta(minutes=i))
+        msg["Message-ID"] = f"<stub-{i}@example.com>"
+        msg.set_content(f"Hello,\n\nThis is benchmark message {i}.\n" + "Lorem ipsum dolor sit amet. " * 20)
+        messages.append(msg.as_bytes())
+    return messages
+
+
+def load_mbox(path: str) -> List[bytes]:
+    return [m.as_bytes() for m in mailbox.mbox(path, create=False)]
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    messages: List[bytes] = []
+
+    def _send(self, line: str) -> None:
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        self._send("* OK [CAPABILITY IMAP4rev1] Brody IMAP stub ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            parts = raw.decode("utf-8", errors="ignore").strip().split(" ", 2)
+            if len(parts) < 2:
+                continue
+            tag, command = parts[0], parts[1].upper()
+            args = parts[2] if len(parts) > 2 else ""
+            if command == "CAPABILITY":
+                self._send("* CAPABILITY IMAP4rev1 AUTH=PLAIN")
+                self._send(f"{tag} OK CAPABILITY completed")
+            elif command == "LOGIN":
+                self._send(f"{tag} OK LOGIN completed")
+            elif command in ("SELECT", "EXAMINE"):
+                self._send(f"* {len(self.messages)} EXISTS")
+                self._send("* 0 RECENT")
+                self._send("* FLAGS (\\Seen)")
+                mode = "READ-ONLY" if command == "EXAMINE" else "READ-WRITE"
+                self._send(f"{tag} OK [{mode}] {command} completed")
+            elif command == "SEARCH":
+                ids = " ".join(str(i) for i in range(1, len(self.messages) + 1))
+                self._send(f"* SEARCH {ids}".rstrip())
+                self._send(f"{tag} OK SEARCH completed")
+            elif command == "FETCH":
+                seq = args.split(" ", 1)[0]
+                try:
+                    data = self.messages[int(seq) - 1]
+                except (ValueError, IndexError):
+                    self._send(f"{tag} BAD invalid message number")
+                    continue
+                self.wfile.write(f"* {seq} FETCH (RFC822 {{{len(data)}}}\r\n".encode("ascii") + data + b")\r\n")
+                self._send(f"{tag} OK FETCH completed")
+            elif command == "NOOP":
+                self._send(f"{tag} OK NOOP completed")
+            elif command == "LOGOUT":
+                self._send("* BYE logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            else:
+                self._send(f"{tag} BAD unsupported command {command}")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_imap_stub(host: str = "127.0.0.1", port: int = 0, messages: Optional[List[bytes]] = None) -> socketserver.TCPServer:
+    """Start the stub in a daemon thread; the bound port is ``server.server_address[1]``."""
+    handler = type("SeededIMAPHandler", (_IMAPHandler,), {"messages": messages if messages is not None else synthetic_corpus()})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="imap-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--mbox", help="Seed the mailbox from this mbox file")
+    parser.add_argument("--count", type=int, default=50, help="Synthetic message count when no mbox is given")
+    args = parser.parse_args()
+    messages = load_mbox(args.mbox) if args.mbox else synthetic_corpus(args.count)
+    server = start_imap_stub(args.host, args.port, messages)
+    print(f"IMAP stub on {args.host}:{server.server_address[1]} with {len(messages)} messages")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Micro-benchmarks for AI response serialisation and LLM output extraction.
+
+Serialisation compares FastAPI's default path (``jsonable_encoder`` then
+``JSONResponse.render``) with ``FastJSONResponse`` on representative
+payloads. Extraction compares the old ``json.loads`` -> ``find``/``rfind``
+slice -> ``json.loads`` approach with ``extract_json`` on typical model
+replies (bare, fenced, prose-wrapped, several objects).
+
+    cd backend
+    python -m benchmarks.json_bench --min-seconds 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from json_utils import FastJSONResponse, extract_json, orjson
+
+_CLASSIFICATION = {
+    "urgency": "high", "category": "work", "sentiment": "neutral",
+    "action": "response_needed", "summary": "Budget review needed before Friday's planning meeting with finance.",
+}
+
+
+def payloads() -> Dict[str, Any]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    fetch = {"ok": True, "count": 50, "results": [{
+        "email": {
+            "id": str(i), "subject": f"Quarterly budget review #{i}", "sender": "cfo@example.com",
+            "timestamp": (start + timedelta(minutes=i)).isoformat(), "body": "Please review the attached figures. " * 40,
+        },
+        "classification": dict(_CLASSIFICATION),
+    } for i in range(50)]}
+    return {
+        "classify": {"email_id": "1", "urgency": "high", "suggested_action": "response_needed", "ai": dict(_CLASSIFICATION)},
+        "fetch_and_classify_50": fetch,
+        "events_20": [{
+            "id": f"event{i}", "title": "Team sync", "start": (start + timedelta(hours=i)).isoformat(),
+            "end": (start + timedelta(hours=i, minutes=30)).isoformat(),
+            "attendees": ["a@example.com", "b@example.com", "c@example.com"], "description": "Weekly sync " * 10,
+        } for i in range(20)],
+    }
+
+
+_OBJ = json.dumps(_CLASSIFICATION)
+_TASKS = json.dumps([{"title": "Review budget", "description": "Check Q3 numbers", "priority": "high",
+                      "estimated_minutes": 30, "due_date": None}] * 3)
+
+REPLIES: Dict[str, tuple] = {
+    "bare_object": (_OBJ, dict),
+    "fenced_object": (f"```json\n{_OBJ}\n```", dict),
+    "prose_object": (f"Sure! Here is the analysis:\n{_OBJ}\nLet me know if you need anything else {{:)}}", dict),
+    "two_objects": (f"{_OBJ}\n{_OBJ}", dict),
+    "bare_array": (_TASKS, list),
+    "prose_array": (f"Here are the tasks [3 total]:\n```json\n{_TASKS}\n```\nGood luck!", list),
+}
+
+
+def legacy_extract(out: str, expect: type) -> Any:
+    """The pre-existing parse in OpenRouterService.classify_email / suggest_tasks."""
+    opener, closer = ("{", "}") if expect is dict else ("[", "]")
+    try:
+        data = json.loads(out)
+        return data if isinstance(data, expect) else None
+    except json.JSONDecodeError:
+        try:
+            start = out.find(opener)
+            end = out.rfind(closer) + 1
+            if start >= 0 and end > start:
+                return json.loads(out[start:end])
+        except Exception:
+            pass
+        return None
+
+
+def _time(fn: Callable[[], Any], min_seconds: float) -> float:
+    """Mean microseconds per call."""
+    loops, start = 0, time.perf_counter()
+    while True:
+        for _ in range(100):
+            fn()
+        loops += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / loops * 1e6
+
+
+def run(min_seconds: float) -> Dict[str, List[Dict[str, Any]]]:
+    serialise = []
+    for name, data in payloads().items():
+        default_us = _time(lambda: JSONResponse(jsonable_encoder(data)).body, min_seconds)
+        fast_us = _time(lambda: FastJSONResponse(data).body, min_seconds)
+        serialise.append({"case": name, "default_us": default_us, "fast_us": fast_us})
+    extract = []
+    for name, (text, expect) in REPLIES.items():
+        legacy_ok = legacy_extract(text, expect) is not None
+        legacy_us = _time(lambda: legacy_extract(text, expect), min_seconds)
+        new_ok = extract_json(text, expect) is not None
+        new_us = _time(lambda: extract_json(text, expect), min_seconds)
+        extract.append({"case": name, "legacy_us": legacy_us, "legacy_ok": legacy_ok, "new_us": new_us, "new_ok": new_ok})
+    return {"serialise": serialise, "extract": extract}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-seconds", type=float, default=0.3, help="Minimum timed duration per case")
+    parser.add_argument("--json", dest="json_out", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.min_seconds)
+    print(f"serialiser: {'orjson' if orjson is not None else 'stdlib json (orjson not installed)'}")
+    print(f"{'response':<24} {'default us':>11} {'fast us':>9} {'speedup':>8}")
+    for r in results["serialise"]:
+        print(f"{r['case']:<24} {r['default_us']:>11.1f} {r['fast_us']:>9.1f} {r['default_us'] / r['fast_us']:>7.1f}x")
+    print(f"\n{'llm reply':<24} {'legacy us':>10} {'ok':>4} {'new us':>8} {'ok':>4}")
+    for r in results["extract"]:
+        print(f"{r['case']:<24} {r['legacy_us']:>10.1f} {'y' if r['legacy_ok'] else 'n':>4} "
+              f"{r['new_us']:>8.1f} {'y' if r['new_ok'] else 'n':>4}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
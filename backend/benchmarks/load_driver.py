@@ -0,0 +1,156 @@
+"""
+Offline load driver for the Brody API.
+
+Starts the OpenRouter and IMAP stubs, boots the app under uvicorn on a free
+port (unless ``--target`` points at a running server) and reports throughput
+and p50/p95/p99 latency per endpoint.
+
+    cd backend && python -m benchmarks.load_driver --concurrency 16 --requests 200 \
+        --latency lognormal:-2,0.5 --empty-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.imap_stub import load_mbox, start_imap_stub, synthetic_corpus
+from benchmarks.openrouter_stub import StubConfig, start_stub
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_app(port: int):
+    """Import the app (after stub env vars are set) and serve it from a thread."""
+    import uvicorn
+    import main as brody_main
+
+    server = uvicorn.Server(uvicorn.Config(brody_main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="brody-app", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def build_scenarios(imap_port: int, fetch_limit: int) -> Dict[str, Callable[[int], Dict[str, Any]]]:
+    """Endpoint name -> function(i) returning the httpx request kwargs."""
+    return {
+        "classify": lambda i: {"method": "POST", "url": "/api/classify-email", "json": {
+            "id": f"bench-{i}", "subject": f"Quarterly numbers #{i}", "sender": "cfo@example.com",
+            "body": "Please review the attached figures before Friday. " * 10,
+            "timestamp": "2024-01-01T09:00:00Z",
+        }},
+        "fetch": lambda i: {"method": "POST", "url": "/email/fetch-and-classify", "json": {
+            "host": "127.0.0.1", "port": imap_port, "use_ssl": False,
+            "username": "bench", "password": "bench", "limit": fetch_limit,
+        }},
+        "brief": lambda i: {"method": "POST", "url": "/calendar/meeting-brief", "json": {"event_id": "event1"}},
+    }
+
+
+async def run_endpoint(client, name: str, make_request, total: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                resp = await client.request(**make_request(i))
+                if resp.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "endpoint": name,
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def drive(base_url: str, scenarios, endpoints: List[str], total: int, concurrency: int) -> List[Dict[str, Any]]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        return [await run_endpoint(client, name, scenarios[name], total, concurrency) for name in endpoints]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="classify,fetch,brief", help="Comma-separated subset of classify,fetch,brief")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--latency", default="fixed:0.05", help="Stub LLM latency: fixed:S | uniform:A,B | lognormal:MU,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--mbox", help="Seed the IMAP stub from this mbox file")
+    parser.add_argument("--fetch-limit", type=int, default=5)
+    parser.add_argument("--target", help="Base URL of an already running Brody (skips in-process app)")
+    parser.add_argument("--json", dest="json_out", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    stub_config = StubConfig(args.latency, args.error_rate, args.empty_rate)
+    llm = start_stub(config=stub_config)
+    imap = start_imap_stub(messages=load_mbox(args.mbox) if args.mbox else synthetic_corpus())
+    imap_port = imap.server_address[1]
+
+    base_url = args.target
+    if not base_url:
+        os.environ.update({
+            "OPENROUTER_API_KEY": "bench",
+            "OPENROUTER_BASE_URL": f"http://127.0.0.1:{llm.server_address[1]}/api/v1",
+            "BRIEF_PREGENERATE": "false",
+            # Fresh shared state per run so the LLM response cache starts cold
+            "SHARED_STATE_PATH": os.path.join(tempfile.mkdtemp(prefix="brody-bench-"), "state.db"),
+        })
+        port = _free_port()
+        _start_app(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    results = asyncio.run(drive(base_url, build_scenarios(imap_port, args.fetch_limit), endpoints, args.requests, args.concurrency))
+
+    print(f"{'endpoint':<10} {'reqs':>6} {'errs':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['endpoint']:<10} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+    print(f"stub LLM requests served: {stub_config.requests}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Local OpenAI-compatible stand-in for OpenRouter.
+
+Serves ``/api/v1/chat/completions`` and ``/api/v1/responses`` with a
+configurable latency distribution, error rate and empty-content rate (the
+latter exercises the ``_chat`` responses/fallback chain).
+
+    python -m benchmarks.openrouter_stub --port 8089 --latency lognormal:-1.5,0.5 --empty-rate 0.1
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Build a latency sampler (seconds) from ``fixed:S``, ``uniform:A,B``
+    or ``lognormal:MU,SIGMA`` (parameters of the underlying normal).
+    """
+    kind, _, params = spec.partition(":")
+    args = [float(x) for x in params.split(",") if x.strip()] if params else []
+    if kind == "fixed":
+        value = args[0] if args else 0.0
+        return lambda: value
+    if kind == "uniform":
+        lo, hi = (args + [0.0, 0.0])[:2]
+        return lambda: random.uniform(lo, hi)
+    if kind == "lognormal":
+        mu, sigma = (args + [math.log(0.2), 0.5])[:2]
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def _canned_reply(prompt_text: str) -> str:
+    # Combined analysis prompts ask for both, so both parts may be present
+    reply = {}
+    if "triage" in prompt_text:
+        reply.update({
+            "urgency": random.choice(["high", "medium", "low"]),
+            "category": "work",
+            "sentiment": "neutral",
+            "action": "fyi",
+            "summary": "Stub classification",
+        })
+    if '"tasks"' in prompt_text:
+        reply["tasks"] = [{
+            "title": "Follow up",
+            "description": "Stub task",
+            "priority": "medium",
+            "estimated_minutes": 15,
+            "due_date": None,
+        }]
+    if reply:
+        return json.dumps(reply)
+    return "Objective: stub brief\nAgenda:\n- Item one\n- Item two"
+
+
+class StubConfig:
+    def __init__(self, latency: str = "fixed:0.05", error_rate: float = 0.0, empty_rate: float = 0.0,
+                 reject_response_format: bool = False):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.empty_rate = empty_rate
+        # Answer 400 to response_format requests, like models without structured output
+        self.reject_response_format = reject_response_format
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with config.lock:
+                config.requests += 1
+            time.sleep(config.sample_latency())
+            if random.random() < config.error_rate:
+                self._send_json(500, {"error": {"message": "stub injected error", "type": "server_error"}})
+                return
+            model = request.get("model", "stub-model")
+            if config.reject_response_format and request.get("response_format"):
+                self._send_json(400, {"error": {"message": "response_format is not supported by this model", "type": "invalid_request_error"}})
+                return
+            if self.path.endswith("/chat/completions"):
+                prompt_text = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+                content = "" if random.random() < config.empty_rate else _canned_reply(prompt_text)
+                self._send_json(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt_text) // 4, "completion_tokens": len(content) // 4,
+                              "total_tokens": (len(prompt_text) + len(content)) // 4},
+                })
+            elif self.path.endswith("/responses"):
+                prompt_text = str(request.get("input", ""))
+                text = _canned_reply(prompt_text)
+                self._send_json(200, {
+                    "id": "resp-stub",
+                    "object": "response",
+                    "created_at": int(time.time()),
+                    "model": model,
+                    "status": "completed",
+                    "output": [{"type": "message", "id": "msg-stub", "status": "completed", "role": "assistant",
+                                "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+                    "usage": {"input_tokens": len(prompt_text) // 4, "output_tokens": len(text) // 4,
+                              "total_tokens": (len(prompt_text) + len(text)) // 4},
+                })
+            else:
+                self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    return Handler
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; the bound port is ``server.server_address[1]``."""
+    server = ThreadingHTTPServer((host, port), _make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="openrouter-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0.05")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--reject-response-format", action="store_true")
+    args = parser.parse_args()
+    server = start_stub(args.host, args.port, StubConfig(args.latency, args.error_rate, args.empty_rate,
+                                                         args.reject_response_format))
+    print(f"OpenRouter stub on http://{args.host}:{server.server_address[1]}/api/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Micro-benchmarks for the email parsing hot path.
+
+Measures messages/sec and peak traced memory for ``parse_email_bytes``,
+``_get_body_from_message``, ``_html_to_text`` and ``_decode_header_value``
+over each corpus kind, and compares against a stored JSON baseline.
+
+    cd backend
+    python -m benchmarks.parse_bench --save-baseline           # record benchmarks/baselines/parse.json
+    python -m benchmarks.parse_bench --compare --tolerance 0.15 # exit 1 on regression
+    python -m benchmarks.parse_bench --bulk 1,2,4               # parse_email_batch scaling by worker count
+
+The committed baseline was recorded on one reference machine; throughput is
+hardware-specific, so re-record it before comparing on different hardware.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from email import policy
+from email.parser import BytesParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.email_corpus import build_corpus
+from services.email_service import (
+    _decode_header_value,
+    _get_body_from_message,
+    _html_to_text,
+    parse_email_batch,
+    parse_email_bytes,
+    shutdown_parse_pool,
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "parse.json")
+
+
+def _inputs(corpus: Dict[str, List[bytes]]) -> Dict[str, Dict[str, Tuple[Callable, List[Any]]]]:
+    """function name -> corpus kind -> (callable, prepared inputs)."""
+    parser = BytesParser(policy=policy.default)
+    raw_parser = BytesParser(policy=policy.compat32)
+    cases: Dict[str, Dict[str, Tuple[Callable, List[Any]]]] = {
+        "parse_email_bytes": {}, "_get_body_from_message": {}, "_html_to_text": {}, "_decode_header_value": {},
+    }
+    for kind, raws in corpus.items():
+        msgs = [parser.parsebytes(r) for r in raws]
+        cases["parse_email_bytes"][kind] = (parse_email_bytes, raws)
+        cases["_get_body_from_message"][kind] = (_get_body_from_message, msgs)
+        # Raw (still RFC 2047 encoded) header values, as they arrive off the wire
+        raw_headers = [raw_parser.parsebytes(r, headersonly=True) for r in raws]
+        headers = [h.get("Subject", "") for h in raw_headers] + [h.get("From", "") for h in raw_headers]
+        cases["_decode_header_value"][kind] = (_decode_header_value, headers)
+        html_parts = []
+        for m in msgs:
+            for part in m.walk():
+                if part.get_content_type() == "text/html":
+                    html_parts.append(part.get_content())
+        if html_parts:
+            cases["_html_to_text"][kind] = (_html_to_text, html_parts)
+    return cases
+
+
+def _measure(fn: Callable, items: List[Any], min_seconds: float) -> Dict[str, float]:
+    # Throughput: repeat the whole batch until min_seconds elapsed
+    loops = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            fn(item)
+        loops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    per_sec = loops * len(items) / elapsed
+    # Peak memory: one traced pass, reported per call
+    tracemalloc.start()
+    peak = 0
+    for item in items:
+        tracemalloc.reset_peak()
+        fn(item)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return {"msgs_per_sec": per_sec, "peak_kib": peak / 1024}
+
+
+def run(per_kind: int, min_seconds: float, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, kinds in _inputs(build_corpus(per_kind)).items():
+        if only and name not in only:
+            continue
+        results[name] = {kind: _measure(fn, items, min_seconds) for kind, (fn, items) in kinds.items()}
+    return results
+
+
+def run_bulk(per_kind: int, worker_counts: List[int]) -> Dict[str, float]:
+    """Throughput of parse_email_batch over the mixed corpus for each worker count."""
+    raws = [raw for kind_raws in build_corpus(per_kind).values() for raw in kind_raws]
+    results: Dict[str, float] = {}
+    for workers in worker_counts:
+        parse_email_batch(raws[:workers * 64], workers=workers)  # warm the pool
+        start = time.perf_counter()
+        parse_email_batch(raws, workers=workers)
+        results[str(workers)] = len(raws) / (time.perf_counter() - start)
+        shutdown_parse_pool()
+    return results
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return human-readable regressions beyond ``tolerance`` (fractional)."""
+    problems = []
+    for name, kinds in current.items():
+        for kind, stats in kinds.items():
+            base = baseline.get(name, {}).get(kind)
+            if not base:
+                continue
+            if stats["msgs_per_sec"] < base["msgs_per_sec"] * (1 - tolerance):
+                problems.append(f"{name}[{kind}] throughput {stats['msgs_per_sec']:.0f}/s vs baseline {base['msgs_per_sec']:.0f}/s")
+            if stats["peak_kib"] > base["peak_kib"] * (1 + tolerance) + 1:
+                problems.append(f"{name}[{kind}] peak memory {stats['peak_kib']:.1f} KiB vs baseline {base['peak_kib']:.1f} KiB")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-kind", type=int, default=40, help="Messages generated per corpus kind")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum timed duration per function/kind")
+    parser.add_argument("--only", help="Comma-separated function names to run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--bulk", help="Comma-separated worker counts for parse_email_batch scaling")
+    args = parser.parse_args(argv)
+
+    if args.bulk:
+        for workers, per_sec in run_bulk(args.per_kind, [int(x) for x in args.bulk.split(",")]).items():
+            print(f"parse_email_batch workers={workers:<3} {per_sec:>10.0f} msgs/sec ({os.cpu_count()} cores)")
+        return 0
+
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; record one with --save-baseline first", file=sys.stderr)
+        return 2
+
+    only = [x.strip() for x in args.only.split(",")] if args.only else None
+    results = run(args.per_kind, args.min_seconds, only)
+
+    print(f"{'function':<24} {'kind':<16} {'msgs/sec':>12} {'peak KiB':>10}")
+    for name, kinds in results.items():
+        for kind, stats in kinds.items():
+            print(f"{name:<24} {kind:<16} {stats['msgs_per_sec']:>12.0f} {stats['peak_kib']:>10.1f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "per_kind": args.per_kind,
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        recorded_on = (stored.get("python"), stored.get("machine"))
+        if recorded_on != (platform.python_version(), platform.machine()):
+            print(f"Note: baseline recorded on Python {recorded_on[0]} / {recorded_on[1]}", file=sys.stderr)
+        problems = compare(results, stored["results"], args.tolerance)
+        for p in problems:
+            print(f"REGRESSION: {p}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
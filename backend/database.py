@@ -2,14 +2,43 @@
 Database configuration and session management
 """
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+except ImportError:
+    create_async_engine = async_sessionmaker = AsyncSession = None
+
 # Database URL from environment with SQLite fallback for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./brody.db")
 
+# Connection pool tuning (ignored for SQLite's single shared connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+
+def _pool_kwargs() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
 # Handle SQLite vs PostgreSQL engine configuration
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
@@ -18,15 +47,84 @@ if DATABASE_URL.startswith("sqlite"):
         poolclass=StaticPool,
     )
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **_pool_kwargs())
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for async route handlers; None when the async driver is missing
+async_engine = None
+AsyncSessionLocal = None
+if create_async_engine:
+    try:
+        ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+        if DATABASE_URL.startswith("sqlite"):
+            if ":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") == "sqlite:":
+                async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=StaticPool)
+            else:
+                async_engine = create_async_engine(ASYNC_DATABASE_URL)
+        else:
+            async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_kwargs())
+        # expire_on_commit=False: async sessions cannot lazy-load expired attributes
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except Exception:
+        async_engine = None
+        AsyncSessionLocal = None
+
+# Feed statement timings into the "db" phase of the request metrics
+try:
+    from metrics import registry as _metrics
+except ImportError:
+    _metrics = None
+
+def _instrument(sync_engine) -> None:
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("brody_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("brody_query_start")
+        if starts:
+            _metrics.observe_phase("db", time.perf_counter() - starts.pop())
+
+if _metrics is not None:
+    _instrument(engine)
+    if async_engine is not None:
+        _instrument(async_engine.sync_engine)
+
+def ensure_table(table, bind) -> None:
+    """
+    Create ``table`` if missing, then add any nullable columns the model gained
+    since it was created (``create(checkfirst=True)`` never alters existing tables).
+    """
+    from sqlalchemy import inspect, text
+
+    table.create(bind=bind, checkfirst=True)
+    existing = {col["name"] for col in inspect(bind).get_columns(table.name)}
+    missing = [col for col in table.columns if col.name not in existing]
+    if not missing:
+        return
+    with bind.begin() as conn:
+        for col in missing:
+            if not col.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{col.name} automatically")
+            conn.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(dialect=bind.dialect)}"
+            ))
+
 def get_db():
     """Database dependency for FastAPI"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Async database dependency for FastAPI; yields None if no async driver is installed"""
+    if AsyncSessionLocal is None:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
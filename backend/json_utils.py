@@ -0,0 +1,105 @@
+"""
+Fast JSON helpers: orjson-backed responses and tolerant extraction of JSON from LLM output
+"""
+import datetime
+import json
+import re
+from typing import Any, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback keeps the same behaviour, just slower
+    orjson = None
+
+_decoder = json.JSONDecoder()
+_FENCE_RE = re.compile(r"```(?:json|JSON)?[ \t]*\n?")
+_OPENERS = "{["
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with ``dumps``.
+
+    Return it directly from a handler (``return FastJSONResponse(data)``) so
+    FastAPI skips the ``jsonable_encoder`` walk over the payload.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def iter_json_values(text: str):
+    """
+    Yield every top-level JSON object/array embedded in ``text``, left to right.
+
+    Code fences are ignored; prose, trailing text and stray braces between
+    values are skipped. Each value is decoded once by the C scanner, and
+    scanning resumes after it, so the whole string is walked a single time.
+    """
+    if "```" in text:
+        text = _FENCE_RE.sub("", text).replace("```", "")
+    pos, end = 0, len(text)
+    while pos < end:
+        brace = text.find("{", pos)
+        bracket = text.find("[", pos)
+        if brace < 0 and bracket < 0:
+            return
+        start = brace if bracket < 0 or (0 <= brace < bracket) else bracket
+        try:
+            value, pos = _decoder.raw_decode(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        yield value
+
+
+def extract_json(text: Optional[str], expect: Optional[type] = None) -> Any:
+    """
+    First JSON value in ``text`` (of type ``expect`` when given), else None.
+
+    Handles bare JSON, ```json fences, leading/trailing prose and multiple
+    concatenated values.
+    """
+    if not text:
+        return None
+    stripped = text.strip()
+    if stripped[:1] in _OPENERS:
+        # Fast path: the whole reply is one JSON value
+        try:
+            value = json.loads(stripped) if orjson is None else orjson.loads(stripped)
+            if expect is None or isinstance(value, expect):
+                return value
+        except ValueError:
+            pass
+    for value in iter_json_values(stripped):
+        if expect is None or isinstance(value, expect):
+            return value
+    return None
+
+
+def extract_all(text: Optional[str], expect: Optional[type] = None) -> List[Any]:
+    """Every top-level JSON value in ``text`` (filtered by ``expect``)."""
+    if not text:
+        return []
+    return [v for v in iter_json_values(text) if expect is None or isinstance(v, expect)]
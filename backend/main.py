@@ -3,12 +3,18 @@ Brody Backend - Proactive Multi-Agent AI Hub
 Main FastAPI application
 """
 
-from fastapi import FastAPI
+import time
+_module_started = time.perf_counter()
+
+from fastapi import Depends, FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 import os
+from contextlib import asynccontextmanager
 
 
 from dotenv import load_dotenv
@@ -16,41 +22,72 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 
-# try:
-from services.openrouter_service import OpenRouterService
-_openrouter = OpenRouterService()
-# except Exception:
-#     _openrouter = None
+from json_utils import FastJSONResponse
+from metrics import MetricsMiddleware, registry as metrics_registry
+
+import importlib
+import logging
+
+from services.llm_telemetry import llm_telemetry
+from services.dedup_service import dedup_index
+from services.preclassifier import preclassifier
+# OpenRouterService (and the openai SDK) is only imported on first AI use
+from services.registry import get_openrouter, get_sync_scheduler, get_token_store, registry as service_registry
+from shared_state import shared_state
 
-try:
-    from routes.auth import router as auth_router
-except Exception:
-    auth_router = None
+# Wall-clock import cost per router module, reported at startup and /health/startup
+_import_seconds = {}
 
-try:
-    from routes.user import router as user_router
-except Exception:
-    user_router = None
+def _import_router(module: str):
+    t0 = time.perf_counter()
+    try:
+        return importlib.import_module(module).router
+    except Exception as e:
+        logging.getLogger("startup").warning(f"Router {module} unavailable: {e}")
+        return None
+    finally:
+        _import_seconds[module] = time.perf_counter() - t0
 
-try:
-    from routes.calendar import router as calendar_router
-except Exception:
-    calendar_router = None
+auth_router = _import_router("routes.auth")
+user_router = _import_router("routes.user")
+calendar_router = _import_router("routes.calendar")
+google_oauth_router = _import_router("routes.google_oauth")
+email_router = _import_router("routes.email")
 
-try:
-    from routes.google_oauth import router as google_oauth_router
-except Exception:
-    google_oauth_router = None
+def _log_startup_report():
+    costs = ", ".join(f"{m}={sec * 1000:.0f}ms" for m, sec in sorted(_import_seconds.items(), key=lambda kv: -kv[1]))
+    logging.getLogger("startup").info(f"main imported in {_main_import_seconds * 1000:.0f}ms; router import cost: {costs}")
 
-try:
-    from routes.email import router as email_router
-except Exception:
-    email_router = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """App-scoped resources: background schedulers (briefs, OAuth refresh, mailbox sync) and the shared AI service and its connection pool."""
+    _log_startup_report()
+    try:
+        shared_state.purge_expired()
+    except Exception as e:
+        logging.getLogger("startup").warning(f"Shared state unavailable: {e}")
+    if calendar_router:
+        from routes.calendar import start_brief_scheduler
+        start_brief_scheduler()
+    # Renew linked-account OAuth tokens ahead of expiry so syncs never refresh inline
+    if os.getenv("OAUTH_REFRESHER", "true").lower() in ("1", "true", "yes"):
+        get_token_store().start()
+    # Periodic syncs of linked mailboxes (email_check_frequency), fair across users
+    if os.getenv("SYNC_SCHEDULER", "true").lower() in ("1", "true", "yes"):
+        get_sync_scheduler().start()
+    try:
+        yield
+    finally:
+        if calendar_router:
+            from routes.calendar import stop_brief_scheduler
+            stop_brief_scheduler()
+        service_registry.close()
 
 app = FastAPI(
     title="Brody API",
     description="Proactive Multi-Agent AI Hub for productivity",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for frontend
@@ -62,6 +99,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency / status / in-flight metrics, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include authentication routes if available
 if auth_router:
     app.include_router(auth_router)
@@ -121,69 +161,97 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/startup")
+async def startup_report():
+    """Import cost per router module and lazy service initialisation times"""
+    return {
+        "imports": {m: round(sec * 1000, 1) for m, sec in _import_seconds.items()},
+        "main_import_ms": round(_main_import_seconds * 1000, 1),
+        "services": service_registry.report(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request and phase metrics"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # AI service status (validates Task 1.1 integration without changing behavior)
 @app.get("/ai/status")
-async def ai_status():
-    available = bool(_openrouter and _openrouter.available())
+async def ai_status(ai=Depends(get_openrouter)):
+    available = bool(ai and ai.available())
     return {
         "provider": "openrouter",
         "available": available,
         "default_model": os.getenv("DEFAULT_MODEL", "anthropic/claude-3.5-sonnet"),
         "fallback_model": os.getenv("FALLBACK_MODEL", "openai/gpt-4o-mini"),
         "only_free": os.getenv("ONLY_FREE_MODELS", "true"),
-        "free_allowlist": os.getenv("FREE_MODEL_ALLOWLIST", "meta-llama/llama-3.1-8b-instruct:free,mistralai/mistral-7b-instruct:free,nousresearch/nous-hermes-2-mistral-7b:free")
+        "free_allowlist": os.getenv("FREE_MODEL_ALLOWLIST", "meta-llama/llama-3.1-8b-instruct:free,mistralai/mistral-7b-instruct:free,nousresearch/nous-hermes-2-mistral-7b:free"),
+        "model_config": ai.model_config if ai else {},
+        "token_budgets": ai.token_budgets if ai else {},
+        "pool": ai.pool_config() if ai else {},
+        "structured_modes": dict(ai.structured_modes) if ai else {},
+        "usage": llm_telemetry.summary()["totals"]
     }
 
+@app.get("/ai/stats", response_class=FastJSONResponse)
+async def ai_stats(recent: int = 50):
+    """Per-task LLM call counters plus the most recent calls"""
+    return FastJSONResponse({**llm_telemetry.summary(), "dedup": dedup_index.stats(), "preclassifier": preclassifier.stats(), "recent": llm_telemetry.recent(recent)})
+
 @app.get("/ai/test")
-async def ai_test():
+async def ai_test(ai=Depends(get_openrouter)):
     """Quick check that OpenRouter returns non-empty content."""
-    if not (_openrouter and _openrouter.available()):
+    if not (ai and ai.available()):
         return {"ok": False, "reason": "client-unavailable"}
-    out = _openrouter._chat([
+    out = await run_in_threadpool(lambda: ai._chat([
         {"role": "system", "content": "Return ONLY the word TEST"},
         {"role": "user", "content": "Say TEST"},
-    ], model=os.getenv("DEFAULT_MODEL"))
+    ], model=os.getenv("DEFAULT_MODEL"), task="test"))
     return {"ok": bool(out and out.strip()), "content": (out or "")[:100]}
 
 # Email endpoints
-@app.post("/api/classify-email")
-async def classify_email(email: EmailMessage):
+@app.post("/api/classify-email", response_class=FastJSONResponse)
+async def classify_email(email: EmailMessage, ai=Depends(get_openrouter)):
     """
     Classify email urgency and suggest actions
     """
     # Prefer AI classification via OpenRouter if available
-    if _openrouter and _openrouter.available():
-        result = _openrouter.classify_email(email.subject, email.body, email.sender)
+    if ai and ai.available():
+        # No near-duplicate reuse here: this endpoint is unauthenticated, so there is no
+        # per-user index to look in and a shared one would leak other users' summaries.
+        # Confident cases are answered by the local pre-classifier.
+        # LLM calls block (HTTP, single-flight waits), so keep them off the event loop
+        result = await run_in_threadpool(preclassifier.classify_or_ask, ai, email.subject, email.body, email.sender)
         if result:
             # Map AI output to existing response style while returning AI fields
             urgency = result.get("urgency", "medium")
             suggested_action = result.get("action", "fyi")
-            return {
+            return FastJSONResponse({
                 "email_id": email.id,
                 "urgency": urgency,
                 "suggested_action": suggested_action,
                 "ai": result
-            }
+            })
     # Fallback: simple rule-based classification
     urgency = "normal"
     if any(word in email.subject.lower() for word in ["urgent", "asap", "important"]):
         urgency = "high"
     elif any(word in email.subject.lower() for word in ["fyi", "optional"]):
         urgency = "low"
-    return {
+    return FastJSONResponse({
         "email_id": email.id,
         "urgency": urgency,
         "suggested_action": "review" if urgency == "high" else "archive"
-    }
+    })
 
-@app.post("/api/suggest-task")
-async def suggest_task(email: EmailMessage):
+@app.post("/api/suggest-task", response_class=FastJSONResponse)
+async def suggest_task(email: EmailMessage, ai=Depends(get_openrouter)):
     """
     Generate task suggestion from email
     """
     # Prefer AI suggestions if available
-    if _openrouter and _openrouter.available():
-        suggestions = _openrouter.suggest_tasks(email.subject, email.body, email.sender)
+    if ai and ai.available():
+        suggestions = await run_in_threadpool(ai.suggest_tasks, email.subject, email.body, email.sender)
         if suggestions:
             # Return the first suggestion as MVP behavior, include all as metadata
             first = suggestions[0]
@@ -194,7 +262,7 @@ async def suggest_task(email: EmailMessage):
                 priority=first.get("priority", "medium"),
                 source_email_id=email.id
             )
-            return {"suggestion": suggestion, "ai": suggestions}
+            return FastJSONResponse({"suggestion": suggestion, "ai": suggestions})
     # Fallback mock suggestion
     suggestion = TaskSuggestion(
         id=f"task_{email.id}",
@@ -203,7 +271,7 @@ async def suggest_task(email: EmailMessage):
         priority="medium",
         source_email_id=email.id
     )
-    return suggestion
+    return FastJSONResponse(suggestion)
 
 # Meeting prep endpoint
 @app.get("/api/prepare-day")
@@ -221,13 +289,14 @@ async def prepare_day():
     }
 
 @app.post("/api/meeting-brief")
-async def generate_meeting_brief(meeting_id: str):
+async def generate_meeting_brief(meeting_id: str, ai=Depends(get_openrouter)):
     """
     Generate comprehensive meeting brief
     """
     # If AI is available, generate a brief
-    if _openrouter and _openrouter.available():
-        content = _openrouter.meeting_brief(
+    if ai and ai.available():
+        content = await run_in_threadpool(
+            ai.meeting_brief,
             title="Team Standup",
             when_iso=datetime.now().isoformat(),
             attendees=["you", "team"],
@@ -256,6 +325,8 @@ async def generate_meeting_brief(meeting_id: str):
     )
     return brief
 
+_main_import_seconds = time.perf_counter() - _module_started
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 9000))
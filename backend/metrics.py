@@ -0,0 +1,171 @@
+"""
+Request metrics: latency histograms, status counters, in-flight gauges and
+phase timers (LLM / IMAP / DB), rendered in Prometheus text format
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# HDR-style log-linear buckets (seconds): 4 sub-buckets per power of two, 50us .. ~100s
+LATENCY_BUCKETS: Tuple[float, ...] = tuple(float(f"{50e-6 * 2 ** (i / 4):.6g}") for i in range(85))
+
+# Per-request phase totals; a dict shared with threadpool workers via context copy
+_request_phases: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("brody_request_phases", default=None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (non-cumulative counts, cumulated on export)."""
+
+    __slots__ = ("counts", "sum", "count", "_lock")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(LATENCY_BUCKETS, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_status: Dict[Tuple[str, str, int], int] = {}
+        self.in_flight: Dict[Tuple[str, str], int] = {}
+        self.phase_latency: Dict[str, Histogram] = {}
+        self.request_phase_latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def _histogram(self, table: dict, key) -> Histogram:
+        h = table.get(key)
+        if h is None:
+            with self._lock:
+                h = table.setdefault(key, Histogram())
+        return h
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, phases: Optional[Dict[str, float]]) -> None:
+        self._histogram(self.request_latency, (method, route)).observe(seconds)
+        key = (method, route, status)
+        with self._lock:
+            self.request_status[key] = self.request_status.get(key, 0) + 1
+        if phases:
+            for name, total in phases.items():
+                self._histogram(self.request_phase_latency, (route, name)).observe(total)
+
+    def observe_phase(self, name: str, seconds: float) -> None:
+        self._histogram(self.phase_latency, name).observe(seconds)
+        phases = _request_phases.get()
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + seconds
+
+    def track_in_flight(self, key: Tuple[str, str], delta: int) -> None:
+        with self._lock:
+            self.in_flight[key] = self.in_flight.get(key, 0) + delta
+
+    def render(self) -> str:
+        lines: List[str] = []
+        _render_histograms(lines, "brody_http_request_duration_seconds", "HTTP request latency by route",
+                           {f'method="{m}",route="{r}"': h for (m, r), h in list(self.request_latency.items())})
+        lines.append("# HELP brody_http_requests_total HTTP responses by route and status code")
+        lines.append("# TYPE brody_http_requests_total counter")
+        for (m, r, s), n in list(self.request_status.items()):
+            lines.append(f'brody_http_requests_total{{method="{m}",route="{r}",status="{s}"}} {n}')
+        lines.append("# HELP brody_http_requests_in_flight Requests currently being served")
+        lines.append("# TYPE brody_http_requests_in_flight gauge")
+        for (m, r), n in list(self.in_flight.items()):
+            lines.append(f'brody_http_requests_in_flight{{method="{m}",route="{r}"}} {n}')
+        _render_histograms(lines, "brody_phase_duration_seconds", "Latency of individual LLM / IMAP / DB calls",
+                           {f'phase="{p}"': h for p, h in list(self.phase_latency.items())})
+        _render_histograms(lines, "brody_request_phase_seconds", "Time spent per phase within one request",
+                           {f'route="{r}",phase="{p}"': h for (r, p), h in list(self.request_phase_latency.items())})
+        return "\n".join(lines) + "\n"
+
+
+def _render_histograms(lines: List[str], name: str, help_text: str, series: Dict[str, Histogram]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, h in series.items():
+        cumulative = 0
+        for bound, c in zip(LATENCY_BUCKETS, h.counts):
+            cumulative += c
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+        lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+        lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as one ``llm`` / ``imap`` / ``db`` call."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe_phase(name, time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and in-flight per route.
+
+    The route template is only known once the router has run, so it is
+    learned per (method, path) and reused for the in-flight gauge on later
+    requests; first-seen paths are counted as ``unresolved`` while in flight.
+    """
+
+    MAX_LEARNED_PATHS = 4096
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[Tuple[str, str], str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path_key = (method, scope["path"])
+        flight_key = (method, self._routes.get(path_key, "unresolved"))
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        phases: Dict[str, float] = {}
+        token = _request_phases.set(phases)
+        registry.track_in_flight(flight_key, 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.track_in_flight(flight_key, -1)
+            _request_phases.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if route != "unmatched" and path_key not in self._routes and len(self._routes) < self.MAX_LEARNED_PATHS:
+                self._routes[path_key] = route
+            registry.observe_request(method, route, status_holder[0], elapsed, phases)
@@ -57,7 +57,11 @@ class EmailAccount(Base if Base != object else object):
         # Encrypted tokens
         access_token = Column(Text)  # Will be encrypted
         refresh_token = Column(Text)  # Will be encrypted
-        
+        token_expiry = Column(DateTime(timezone=True))
+
+        # Gmail: mailbox historyId reached by the last sync (users.history.list cursor)
+        history_id = Column(String(32))
+
         last_sync = Column(DateTime(timezone=True))
         is_active = Column(Boolean, default=True)
         created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -77,4 +81,20 @@ class UserSession(Base if Base != object else object):
         # Session metadata
         ip_address = Column(String(45))  # IPv6 compatible
         user_agent = Column(Text)
-        is_active = Column(Boolean, default=True)
\ No newline at end of file
+        is_active = Column(Boolean, default=True)
+
+class StoredEmail(Base if Base != object else object):
+    """Parsed email messages ingested via IMAP sync or archive import"""
+    __tablename__ = "emails"
+
+    if Column:
+        id = Column(String, primary_key=True, default=generate_uuid)
+        user_id = Column(String, nullable=False, index=True)
+        account_id = Column(String, index=True)
+        message_id = Column(String(998), index=True)
+        subject = Column(Text)
+        sender = Column(String(512))
+        received_at = Column(DateTime(timezone=True))
+        body = Column(Text)
+        source = Column(String(50))  # 'imap', 'mbox', 'maildir', 'gmail'
+        created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,29 +1,38 @@
 """
 Authentication API endpoints
 """
+import os
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 
+from cache import TTLCache
+
 try:
-    from sqlalchemy.orm import Session
-    from database import get_db
+    from sqlalchemy import select
+    from database import get_async_db
     from models import User, UserSession
     from auth import (
-        verify_password, 
-        get_password_hash, 
+        verify_password_async,
+        get_password_hash_async,
+        password_pool_stats,
+        PasswordPoolSaturated,
         create_access_token, 
         create_refresh_token,
         verify_token,
+        verify_token_cached,
         generate_session_token
     )
 except ImportError:
     # Graceful fallback for missing dependencies
-    Session = object
-    get_db = lambda: None
+    get_async_db = lambda: None
     User = UserSession = object
+    password_pool_stats = lambda: {}
+
+    class PasswordPoolSaturated(Exception):
+        pass
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -64,7 +73,28 @@ MOCK_USER = {
     "preferences": {}
 }
 
-def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)) -> dict:
+# user id -> plain dict snapshot of the user row (detached from any session); per worker, kept short
+_user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "15")),
+)
+
+def _user_to_dict(user) -> dict:
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "is_active": user.is_active,
+        "is_verified": user.is_verified,
+        "created_at": user.created_at,
+        "preferences": user.preferences or {},
+    }
+
+def invalidate_user_cache(user_id: str) -> None:
+    """Drop the cached user row; call after every commit that writes to the users table"""
+    _user_cache.pop(user_id)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_async_db)) -> dict:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -72,29 +102,47 @@ def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db))
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    payload = verify_token(token)
+    payload = verify_token_cached(token)
     if payload is None:
         raise credentials_exception
     
+    # Only plain access tokens authenticate: refresh tokens and purpose-bound
+    # tokens (e.g. the Gmail link OAuth state, which travels in URLs) do not
+    if payload.get("type") or payload.get("purpose"):
+        raise credentials_exception
+    
     user_id: str = payload.get("sub")
     if user_id is None:
         raise credentials_exception
     
-    # If database available, fetch real user
+    # If database available, fetch real user (cached to keep the DB off the hot path)
     if db and User != object:
+        cached = _user_cache.get(user_id)
+        if cached is not None:
+            return cached
         try:
-            user = db.query(User).filter(User.id == user_id).first()
+            result = await db.execute(select(User).where(User.id == user_id))
+            user = result.scalars().first()
             if user is None:
                 raise credentials_exception
-            return user
+            snapshot = _user_to_dict(user)
+            _user_cache.set(user_id, snapshot)
+            return snapshot
         except Exception:
             pass
     
     # Fallback to mock user for development
     return MOCK_USER
 
+def _auth_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=LoginResponse)
-async def register(user_data: UserCreate, db = Depends(get_db)):
+async def register(user_data: UserCreate, db = Depends(get_async_db)):
     """Register new user"""
     # Development fallback
     if not db or User == object:
@@ -107,7 +155,8 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
     
     try:
         # Check if user already exists
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
+        result = await db.execute(select(User).where(User.email == user_data.email))
+        existing_user = result.scalars().first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -115,7 +164,7 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
             )
         
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         db_user = User(
             name=user_data.name,
             email=user_data.email,
@@ -124,8 +173,9 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
             is_verified=False  # Email verification would be implemented here
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        invalidate_user_cache(db_user.id)
         
         # Create tokens
         access_token = create_access_token({"sub": db_user.id, "email": db_user.email})
@@ -149,6 +199,10 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
         
         return LoginResponse(user=user_response, token=token)
         
+    except HTTPException:
+        raise
+    except PasswordPoolSaturated:
+        raise _auth_busy_exception()
     except Exception as e:
         # Fallback to mock response on any database error
         mock_token = Token(
@@ -159,7 +213,7 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
         return LoginResponse(user=UserResponse(**MOCK_USER), token=mock_token)
 
 @router.post("/login", response_model=LoginResponse)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_async_db)):
     """Login user"""
     # Development fallback
     if not db or User == object:
@@ -172,8 +226,9 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(g
     
     try:
         # Authenticate user
-        user = db.query(User).filter(User.email == form_data.username).first()
-        if not user or not verify_password(form_data.password, user.password_hash):
+        result = await db.execute(select(User).where(User.email == form_data.username))
+        user = result.scalars().first()
+        if not user or not await verify_password_async(form_data.password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -188,7 +243,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(g
         
         # Update last login
         user.last_login = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        invalidate_user_cache(user.id)
         
         # Create tokens
         access_token = create_access_token({"sub": user.id, "email": user.email})
@@ -214,6 +270,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(g
         
     except HTTPException:
         raise
+    except PasswordPoolSaturated:
+        raise _auth_busy_exception()
     except Exception:
         # Fallback on database errors
         mock_token = Token(
@@ -239,6 +297,11 @@ async def get_me(current_user: dict = Depends(get_current_user)):
         preferences=current_user.preferences or {}
     )
 
+@router.get("/stats")
+async def auth_stats(current_user: dict = Depends(get_current_user)):
+    """Password hashing pool metrics (authenticated users only)"""
+    return {"password_hash_pool": password_pool_stats()}
+
 @router.post("/refresh")
 async def refresh_token(refresh_token: str = Form(...)):
     """Refresh access token"""
@@ -1,37 +1,45 @@
+import os
 from fastapi import APIRouter, HTTPException
 from typing import List, Optional, Dict, Any
+from json_utils import FastJSONResponse
 from services.calendar_service import CalendarService
-from services.openrouter_service import OpenRouterService
+from services.brief_service import BriefService
+from services.registry import get_openrouter
 from pydantic import BaseModel
 from datetime import datetime
 
 router = APIRouter(prefix="/calendar", tags=["calendar"])
 calendar_service = CalendarService()
-ai = OpenRouterService()
+brief_service = BriefService(calendar_service, get_openrouter)
 
 class MeetingBriefRequest(BaseModel):
     event_id: str
     include_related: Optional[bool] = False
 
-@router.get("/events")
-def get_events() -> List[Dict[str, Any]]:
-    return calendar_service.get_upcoming_events()
+# Started and stopped from the application lifespan in main.py
+def start_brief_scheduler():
+    if os.getenv("BRIEF_PREGENERATE", "true").lower() in ("1", "true", "yes"):
+        brief_service.start()
 
-@router.post("/meeting-brief")
-def meeting_brief(req: MeetingBriefRequest) -> Dict[str, Any]:
+def stop_brief_scheduler():
+    brief_service.stop()
+
+@router.get("/events", response_class=FastJSONResponse)
+def get_events():
+    return FastJSONResponse(calendar_service.get_upcoming_events())
+
+@router.post("/meeting-brief", response_class=FastJSONResponse)
+def meeting_brief(req: MeetingBriefRequest):
     event = calendar_service.get_event(req.event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
-    # Use AI to generate a meeting brief if available
-    ai_brief = None
-    if ai and ai.available():
-        ai_brief = ai.meeting_brief(
-            title=event["title"],
-            when_iso=event["start"],
-            attendees=event["attendees"],
-            description=event.get("description", "")
-        )
-    return {
+    # Serve the pregenerated brief if the event is unchanged, else generate on demand
+    ai_brief = brief_service.get(event)
+    pregenerated = ai_brief is not None
+    if ai_brief is None:
+        ai_brief = brief_service.generate(event)
+    return FastJSONResponse({
         "event": event,
         "brief": ai_brief or "No AI brief available (using mock or fallback)",
-    }
+        "pregenerated": pregenerated,
+    })
@@ -1,15 +1,36 @@
-from fastapi import APIRouter, HTTPException
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
-from services.email_service import EmailService, parse_email_bytes
-from services.openrouter_service import OpenRouterService
+from json_utils import FastJSONResponse
+from services.email_service import EmailService, new_feed_parser, parse_email_bytes, parse_email_message
+from services.dedup_service import dedup_index
+from services.mail_import import IMPORT_MAX_BYTES, IMPORT_READ_CHUNK, MailImporter
+from services.preclassifier import preclassifier
+from services.registry import get_gmail_sync, get_openrouter, get_sync_scheduler
 
+try:
+    from routes.auth import get_current_user
+except ImportError:
+    get_current_user = lambda: {"id": "mock_user", "preferences": {}}
+
+try:
+    from database import SessionLocal
+    from models import StoredEmail
+except ImportError:
+    SessionLocal = StoredEmail = None
+
+
+# Upper bound on 'file' fields per /email/parse/batch request (larger requests get a 400)
+PARSE_BATCH_MAX_FILES = int(os.getenv("PARSE_BATCH_MAX_FILES", "100"))
 
 router = APIRouter(prefix="/email", tags=["email"])
 email_service = EmailService()
-ai = OpenRouterService()
+importer = MailImporter(SessionLocal, StoredEmail)
 
 
 class IMAPCreds(BaseModel):
@@ -56,6 +77,10 @@ def parse(raw: RawEmail) -> Dict[str, Any]:
     except Exception:
         data = raw.raw.encode("utf-8", errors="ignore")
     parsed = parse_email_bytes(data)
+    return _jsonable(parsed)
+
+
+def _jsonable(parsed: Dict[str, Any]) -> Dict[str, Any]:
     # Make timestamp JSON serializable
     ts = parsed.get("timestamp")
     if isinstance(ts, datetime):
@@ -63,8 +88,62 @@ def parse(raw: RawEmail) -> Dict[str, Any]:
     return parsed
 
 
-@router.post("/fetch-and-classify")
-def fetch_and_classify(creds: IMAPCreds) -> Dict[str, Any]:
+def _parse_upload(upload) -> Dict[str, Any]:
+    # Feed the spooled upload through the incremental parser chunk by chunk
+    feed = new_feed_parser()
+    while True:
+        chunk = upload.file.read(IMPORT_READ_CHUNK)
+        if not chunk:
+            break
+        feed.feed(chunk)
+    return _jsonable(parse_email_message(feed.close()))
+
+
+def _parse_chunks(chunks: List[bytes]) -> Dict[str, Any]:
+    # Release each chunk once the parser has it, so the raw body and the message don't both stay whole
+    feed = new_feed_parser()
+    chunks.reverse()
+    while chunks:
+        feed.feed(chunks.pop())
+    return _jsonable(parse_email_message(feed.close()))
+
+
+@router.post("/parse/raw")
+async def parse_raw(request: Request) -> Dict[str, Any]:
+    """
+    Parse one RFC822 message sent as a binary body (application/octet-stream,
+    message/rfc822) or as multipart field ``file``.
+
+    The body is collected as raw chunks, with no base64 or str round-trip, and
+    parsed in a worker thread so the event loop never runs the parser.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "file"):
+            raise HTTPException(status_code=400, detail="Missing 'file' field")
+        return await run_in_threadpool(_parse_upload, upload)
+    chunks = [chunk async for chunk in request.stream() if chunk]
+    return await run_in_threadpool(_parse_chunks, chunks)
+
+
+@router.post("/parse/batch")
+async def parse_batch(request: Request) -> Dict[str, Any]:
+    """Parse up to PARSE_BATCH_MAX_FILES messages uploaded as repeated multipart ``file`` fields, in order."""
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data with one or more 'file' fields")
+    form = await request.form(max_files=PARSE_BATCH_MAX_FILES)
+    uploads = [value for _, value in form.multi_items() if hasattr(value, "file")]
+
+    def _parse_all() -> List[Dict[str, Any]]:
+        return [_parse_upload(u) for u in uploads]
+
+    results = await run_in_threadpool(_parse_all)
+    return {"count": len(results), "results": results}
+
+
+@router.post("/fetch-and-classify", response_class=FastJSONResponse)
+def fetch_and_classify(creds: IMAPCreds, ai=Depends(get_openrouter)):
     try:
         client = email_service.connect(creds.host, creds.username, creds.password, creds.port or 993, creds.use_ssl is not False)
         try:
@@ -76,19 +155,39 @@ def fetch_and_classify(creds: IMAPCreds) -> Dict[str, Any]:
                 pass
 
         results: List[Dict[str, Any]] = []
+        mailbox_key = f"{creds.username}@{creds.host}"
         for m in messages:
             ai_result: Optional[Dict[str, Any]] = None
+            duplicate_of: Optional[Dict[str, Any]] = None
+            tasks: Optional[List[Dict[str, Any]]] = None
             if ai and ai.available():
-                ai_result = ai.classify_email(m.get("subject", ""), m.get("body", ""), m.get("sender", ""))
+                # Near-duplicates of an already classified message inherit its classification
+                fingerprint = dedup_index.fingerprint(m.get("subject", ""), m.get("body", ""))
+                match = dedup_index.lookup(mailbox_key, fingerprint)
+                if match:
+                    ai_result = dict(match[0])
+                    duplicate_of = {"id": match[1], "distance": match[2]}
+                else:
+                    # LLM fallbacks go through analyze_email, so suggested tasks come from the same call
+                    ai_result = preclassifier.classify_or_ask(ai, m.get("subject", ""), m.get("body", ""), m.get("sender", ""))
+                    if ai_result:
+                        dedup_index.add(mailbox_key, fingerprint, ai_result, m.get("id", ""))
+                        analysis = ai.cached_analysis(m.get("subject", ""), m.get("body", ""), m.get("sender", ""))
+                        tasks = analysis["tasks"] if analysis else None
 
             if ai_result:
-                results.append({
+                item = {
                     "email": {
                         **m,
                         "timestamp": m.get("timestamp").isoformat() if isinstance(m.get("timestamp"), datetime) else m.get("timestamp")
                     },
                     "classification": ai_result,
-                })
+                }
+                if tasks is not None:
+                    item["tasks"] = tasks
+                if duplicate_of:
+                    item["near_duplicate_of"] = duplicate_of
+                results.append(item)
             else:
                 # fallback simple heuristic
                 subj = (m.get("subject") or "").lower()
@@ -107,6 +206,94 @@ def fetch_and_classify(creds: IMAPCreds) -> Dict[str, Any]:
                     }
                 })
 
-        return {"ok": True, "count": len(results), "results": results}
+        return FastJSONResponse({"ok": True, "count": len(results), "results": results})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/gmail/sync")
+async def gmail_sync(current_user: dict = Depends(get_current_user), gmail=Depends(get_gmail_sync)) -> Dict[str, Any]:
+    """Incremental Gmail API sync of the user's linked accounts (see /auth/google/link)."""
+    if not gmail.available():
+        raise HTTPException(status_code=503, detail="Database not configured")
+    results = await run_in_threadpool(gmail.sync_user, current_user["id"])
+    return {"accounts": len(results), "results": results}
+
+
+@router.get("/sync/status")
+def sync_status(current_user: dict = Depends(get_current_user), scheduler=Depends(get_sync_scheduler)) -> Dict[str, Any]:
+    """Background sync scheduler: queue depth, in-flight syncs per host, dispatch lag and backoff."""
+    return scheduler.stats()
+
+
+def _import_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Archive exceeds the {IMPORT_MAX_BYTES} byte import limit")
+
+
+def _copy_capped(src, dst) -> None:
+    """Copy an uploaded file in chunks, giving up once it passes IMPORT_MAX_BYTES."""
+    total = 0
+    while True:
+        chunk = src.read(IMPORT_READ_CHUNK)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > IMPORT_MAX_BYTES:
+            raise _import_too_large()
+        dst.write(chunk)
+
+
+@router.post("/import", status_code=202)
+async def import_archive(request: Request, format: str = "mbox", current_user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    Import an mbox file or a zip/tar Maildir archive.
+
+    Accepts either a raw request body or a multipart upload (field ``file``).
+    The upload is streamed to a temporary file in chunks, then ingested in the
+    background; poll ``GET /email/import/{job_id}`` for progress. Uploads
+    over IMPORT_MAX_BYTES are rejected with a 413.
+    """
+    if format not in MailImporter.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > IMPORT_MAX_BYTES:
+        raise _import_too_large()
+    tmp = tempfile.NamedTemporaryFile(prefix="brody-import-", delete=False)
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or not hasattr(upload, "file"):
+                raise HTTPException(status_code=400, detail="Missing 'file' field")
+            await run_in_threadpool(_copy_capped, upload.file, tmp)
+        else:
+            # Buffer network chunks and write ~1 MiB at a time off the event loop
+            pending: List[bytes] = []
+            size = total = 0
+            async for chunk in request.stream():
+                total += len(chunk)
+                if total > IMPORT_MAX_BYTES:
+                    raise _import_too_large()
+                pending.append(chunk)
+                size += len(chunk)
+                if size >= IMPORT_READ_CHUNK:
+                    await run_in_threadpool(tmp.write, b"".join(pending))
+                    pending, size = [], 0
+            if pending:
+                await run_in_threadpool(tmp.write, b"".join(pending))
+        tmp.close()
+        job = importer.start(current_user.get("id", "mock_user"), format, tmp.name)
+    except Exception:
+        tmp.close()
+        os.unlink(tmp.name)
+        raise
+    return job.to_dict()
+
+
+@router.get("/import/{job_id}")
+def import_status(job_id: str, current_user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+    job = importer.get(job_id)
+    # Other users' jobs look exactly like missing ones
+    if not job or job.user_id != current_user.get("id", "mock_user"):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.to_dict()
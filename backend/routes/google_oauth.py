@@ -1,23 +1,107 @@
-from fastapi import APIRouter, Request, Response, status
+import hmac
+import secrets
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Request, Response, status
 from fastapi.responses import RedirectResponse, JSONResponse
 from services.google_oauth_service import get_authorization_url, fetch_token_from_code
+from services.registry import get_gmail_sync, get_token_store
 import os
 
+try:
+    from auth import create_access_token, verify_token
+    from routes.auth import get_current_user
+except ImportError:
+    create_access_token = verify_token = None
+    get_current_user = lambda: {"id": "mock_user", "preferences": {}}
+
 router = APIRouter(prefix="/auth/google", tags=["auth", "google"])
 
+# OAuth state for account linking: a short-lived signed token naming the Brody user.
+# Its nonce must match the cookie /link set, so a leaked consent URL cannot be
+# completed from another browser.
+LINK_PURPOSE = "gmail_link"
+LINK_COOKIE = "brody_gmail_link"
+LINK_TTL = timedelta(minutes=10)
+
+
+def _link_payload(state):
+    """Claims of a state issued by /link, else None."""
+    if not state or verify_token is None:
+        return None
+    payload = verify_token(state) or {}
+    return payload if payload.get("purpose") == LINK_PURPOSE else None
+
+
+def _link_user(payload, nonce):
+    """User id of a link state whose nonce matches the browser's cookie, else None."""
+    expected = (payload or {}).get("nonce")
+    if not expected or not nonce or not hmac.compare_digest(expected, nonce):
+        return None
+    return payload.get("sub")
+
+
 @router.get("/login")
 def google_login():
-    url = get_authorization_url()
+    try:
+        url = get_authorization_url()
+    except ImportError:
+        return JSONResponse({"error": "Google OAuth support is not installed"}, status_code=503)
     return RedirectResponse(url)
 
+
+@router.get("/link")
+async def google_link(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    """
+    Authorization URL that links the Gmail account to the current user for API sync.
+
+    Also sets a short-lived cookie that the callback checks, so the consent flow
+    must finish in the browser that started it (cross-origin callers need
+    ``credentials: "include"``).
+    """
+    if create_access_token is None:
+        return JSONResponse({"error": "Authentication is not configured"}, status_code=503)
+    nonce = secrets.token_urlsafe(24)
+    state = create_access_token({"sub": current_user["id"], "purpose": LINK_PURPOSE, "nonce": nonce}, LINK_TTL)
+    try:
+        url = get_authorization_url(state)
+    except ImportError:
+        return JSONResponse({"error": "Google OAuth support is not installed"}, status_code=503)
+    response.set_cookie(
+        LINK_COOKIE, nonce, max_age=int(LINK_TTL.total_seconds()), path=router.prefix,
+        httponly=True, samesite="lax", secure=request.url.scheme == "https",
+    )
+    return {"authorization_url": url}
+
+
 @router.get("/callback")
 def google_callback(request: Request):
     code = request.query_params.get("code")
     state = request.query_params.get("state")
     if not code:
         return JSONResponse({"error": "Missing code"}, status_code=400)
+    link = _link_payload(state)
+    user_id = _link_user(link, request.cookies.get(LINK_COOKIE))
+    if link is not None and user_id is None:
+        return JSONResponse({"error": "Account linking must be finished in the browser that started it"}, status_code=400)
+    gmail = get_gmail_sync()
+    if link is not None and not gmail.available():
+        # Never hand a linking user's Google tokens back to the browser
+        return JSONResponse({"error": "Account linking is not available"}, status_code=503)
     try:
         creds = fetch_token_from_code(code, state)
+        if user_id:
+            # Keep the credentials server-side; the client only learns which mailbox was linked
+            from services.gmail_sync import GmailClient
+
+            profile = GmailClient(gmail.http, creds.token).profile()
+            account_id = get_token_store().save(
+                user_id, "gmail", profile["emailAddress"], creds.token, getattr(creds, "refresh_token", None),
+                getattr(creds, "expiry", None),
+            )
+            linked = JSONResponse({"linked": True, "account_id": account_id, "email_address": profile["emailAddress"]})
+            linked.delete_cookie(LINK_COOKIE, path=router.prefix)
+            return linked
         # For MVP, just return the tokens (DO NOT do this in production)
         return JSONResponse({
             "access_token": creds.token,
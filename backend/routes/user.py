@@ -1,14 +1,30 @@
 """
 User preferences and settings API endpoints
 """
-from typing import Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from pydantic import BaseModel
 
+from cache import TTLCache
+
+try:
+    from routes.auth import MOCK_USER, get_current_user, invalidate_user_cache
+except ImportError:
+    MOCK_USER = {"id": "mock_user", "preferences": {}}
+    get_current_user = lambda: MOCK_USER
+    invalidate_user_cache = lambda user_id: None
+
 try:
-    from routes.auth import get_current_user
+    from sqlalchemy import select
+    from database import get_async_db
+    from models import User
 except ImportError:
-    get_current_user = lambda: {"id": "mock_user", "preferences": {}}
+    get_async_db = lambda: None
+    User = object
 
 router = APIRouter(prefix="/user", tags=["user"])
 
@@ -53,15 +69,102 @@ DEFAULT_PREFERENCES = {
     }
 }
 
+# Merged preferences per user; the write counter guards against stale refills.
+# Per worker: another worker may serve the old value (and ETag) until the TTL expires
+_prefs_cache = TTLCache(
+    maxsize=int(os.getenv("PREFERENCES_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PREFERENCES_CACHE_TTL", "30")),
+)
+# One counter for all users keeps memory bounded; a write only costs concurrent fills a retry
+_prefs_writes = 0
+_prefs_lock = threading.Lock()
+
+def _merge_preferences(stored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Overlay stored (partial) preferences on the defaults, one level deep"""
+    merged = dict(DEFAULT_PREFERENCES)
+    for key, value in (stored or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+def _etag(preferences: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(preferences, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+def _cached_preferences(user_id: str, stored: Optional[Dict[str, Any]]) -> tuple:
+    """Return (merged preferences, etag) for the user, filling the cache on miss"""
+    entry = _prefs_cache.get(user_id)
+    if entry is not None:
+        return entry[1], entry[2]
+    with _prefs_lock:
+        version = _prefs_writes
+    merged = _merge_preferences(stored)
+    etag = _etag(merged)
+    with _prefs_lock:
+        # Skip the fill if a write landed while we were merging
+        if _prefs_writes == version:
+            _prefs_cache.set(user_id, (version, merged, etag))
+    return merged, etag
+
+def _store_preferences(user_id: str, merged: Dict[str, Any]) -> str:
+    """Record a write: bump the write counter and cache the new merged preferences"""
+    global _prefs_writes
+    etag = _etag(merged)
+    with _prefs_lock:
+        _prefs_writes += 1
+        _prefs_cache.set(user_id, (_prefs_writes, merged, etag))
+    invalidate_user_cache(user_id)
+    return etag
+
+async def _persist_preferences(db, user_id: str, current_user, apply) -> Dict[str, Any]:
+    """
+    Apply a partial update to the stored preferences and return the new stored dict.
+
+    ``apply`` receives a copy of the stored (partial) preferences and mutates it.
+    Falls back to the in-memory copy when no database is configured or for the
+    development mock user (who has no row); for real users a missing row is a
+    404 and a failed write a 503, so callers never cache an unsaved update.
+    """
+    if db is None or User == object or user_id == MOCK_USER["id"]:
+        stored = dict(current_user.get("preferences") or {})
+        apply(stored)
+        return stored
+    try:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        stored = dict(user.preferences or {})
+        apply(stored)
+        user.preferences = stored  # reassign so the JSON column is flagged dirty
+        await db.commit()
+        return stored
+    except HTTPException:
+        raise
+    except Exception:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Preferences storage is unavailable, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+
 @router.get("/preferences", response_model=UserPreferencesResponse)
-async def get_user_preferences(current_user: dict = Depends(get_current_user)):
-    """Get user preferences"""
+async def get_user_preferences(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get user preferences (supports If-None-Match)"""
     user_id = current_user.get("id", "mock_user")
-    preferences = current_user.get("preferences", DEFAULT_PREFERENCES)
+    merged_preferences, etag = _cached_preferences(user_id, current_user.get("preferences"))
     
-    # Ensure all default keys exist
-    merged_preferences = {**DEFAULT_PREFERENCES, **preferences}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     
+    response.headers["ETag"] = etag
     return UserPreferencesResponse(
         user_id=user_id,
         preferences=merged_preferences
@@ -70,25 +173,25 @@ async def get_user_preferences(current_user: dict = Depends(get_current_user)):
 @router.put("/preferences", response_model=UserPreferencesResponse)
 async def update_user_preferences(
     preferences_update: PreferencesUpdate,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_async_db)
 ):
     """Update user preferences"""
     user_id = current_user.get("id", "mock_user")
-    current_prefs = current_user.get("preferences", DEFAULT_PREFERENCES)
-    
-    # Update preferences with new values
-    updated_preferences = {**current_prefs}
     update_data = preferences_update.dict(exclude_unset=True)
     
-    for key, value in update_data.items():
-        if isinstance(value, dict) and key in updated_preferences:
-            # Merge nested dictionaries
-            updated_preferences[key] = {**updated_preferences[key], **value}
-        else:
-            updated_preferences[key] = value
+    def apply(stored: Dict[str, Any]) -> None:
+        for key, value in update_data.items():
+            if isinstance(value, dict) and isinstance(stored.get(key), dict):
+                # Merge nested dictionaries
+                stored[key] = {**stored[key], **value}
+            else:
+                stored[key] = value
     
-    # In a real implementation, this would update the database
-    # For now, we'll just return the updated preferences
+    stored = await _persist_preferences(db, user_id, current_user, apply)
+    updated_preferences = _merge_preferences(stored)
+    response.headers["ETag"] = _store_preferences(user_id, updated_preferences)
     
     return UserPreferencesResponse(
         user_id=user_id,
@@ -99,11 +202,12 @@ async def update_user_preferences(
 async def update_preference_key(
     key: str,
     value: Any,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_async_db)
 ):
     """Update a specific preference key"""
     user_id = current_user.get("id", "mock_user")
-    current_prefs = current_user.get("preferences", DEFAULT_PREFERENCES)
     
     if key not in DEFAULT_PREFERENCES:
         raise HTTPException(
@@ -112,8 +216,8 @@ async def update_preference_key(
         )
     
     # Update the specific key
-    updated_preferences = {**current_prefs}
-    updated_preferences[key] = value
+    stored = await _persist_preferences(db, user_id, current_user, lambda prefs: prefs.__setitem__(key, value))
+    response.headers["ETag"] = _store_preferences(user_id, _merge_preferences(stored))
     
     return {
         "user_id": user_id,
@@ -123,11 +227,17 @@ async def update_preference_key(
     }
 
 @router.post("/preferences/reset")
-async def reset_user_preferences(current_user: dict = Depends(get_current_user)):
+async def reset_user_preferences(
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_async_db)
+):
     """Reset user preferences to defaults"""
     user_id = current_user.get("id", "mock_user")
+    await _persist_preferences(db, user_id, current_user, lambda prefs: prefs.clear())
+    response.headers["ETag"] = _store_preferences(user_id, _merge_preferences({}))
     
     return UserPreferencesResponse(
         user_id=user_id,
         preferences=DEFAULT_PREFERENCES
-    )
\ No newline at end of file
+    )
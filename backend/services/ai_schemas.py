@@ -0,0 +1,191 @@
+import re
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, ValidationInfo, field_validator
+
+
+class Urgency(str, Enum):
+    high = "high"
+    medium = "medium"
+    low = "low"
+
+
+class Category(str, Enum):
+    work = "work"
+    personal = "personal"
+    promotional = "promotional"
+    newsletter = "newsletter"
+    meeting = "meeting"
+    task = "task"
+
+
+class Sentiment(str, Enum):
+    positive = "positive"
+    neutral = "neutral"
+    negative = "negative"
+
+
+class Action(str, Enum):
+    response_needed = "response_needed"
+    fyi = "fyi"
+    action_item = "action_item"
+    meeting_invite = "meeting_invite"
+
+
+# Near-misses models commonly produce, mapped onto the enum values
+_SYNONYMS: Dict[str, str] = {
+    "urgent": "high", "critical": "high", "normal": "medium", "moderate": "medium", "none": "low",
+    "promotion": "promotional", "marketing": "promotional", "promo": "promotional", "spam": "promotional",
+    "newsletters": "newsletter", "business": "work", "calendar": "meeting", "todo": "task",
+    "reply_needed": "response_needed", "respond": "response_needed", "reply": "response_needed",
+    "info": "fyi", "informational": "fyi", "no_action": "fyi", "action": "action_item", "todo_item": "action_item",
+    "meeting_request": "meeting_invite", "invite": "meeting_invite",
+    "asap": "high", "immediate": "high", "important": "high",
+}
+
+_MINUTES_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hours?|m|min|mins|minutes?)?\b", re.IGNORECASE)
+
+
+def _normalize_enum(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    key = re.sub(r"[\s\-]+", "_", value.strip().lower())
+    return _SYNONYMS.get(key, key)
+
+
+# Fallbacks for values outside the enum (e.g. category "finance"), matching the rule-based
+# fallback. Only applied when validating with context {"coerce_enums": True}, i.e. on the
+# repair pass, so invented labels still show up as "repaired" in the parse telemetry.
+_ENUM_DEFAULTS: Dict[str, Enum] = {
+    "urgency": Urgency.medium, "category": Category.work, "sentiment": Sentiment.neutral, "action": Action.fyi,
+}
+
+
+class EmailClassification(BaseModel):
+    urgency: Urgency
+    category: Category
+    sentiment: Sentiment = Sentiment.neutral
+    action: Action
+    summary: str = Field(default="", max_length=400)
+
+    @field_validator("urgency", "category", "sentiment", "action", mode="before")
+    @classmethod
+    def _normalize(cls, value: Any, info: ValidationInfo) -> Any:
+        value = _normalize_enum(value)
+        default = _ENUM_DEFAULTS[info.field_name]
+        if value in type(default)._value2member_map_ or not (info.context or {}).get("coerce_enums"):
+            return value
+        return default
+
+
+class Priority(str, Enum):
+    high = "high"
+    medium = "medium"
+    low = "low"
+
+
+class SuggestedTask(BaseModel):
+    title: str
+    description: str = ""
+    priority: Priority = Priority.medium
+    estimated_minutes: Optional[int] = None
+    due_date: Optional[str] = None
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def _normalize(cls, value: Any) -> Any:
+        value = _normalize_enum(value)
+        return value if value in Priority._value2member_map_ else Priority.medium
+
+    @field_validator("estimated_minutes", mode="before")
+    @classmethod
+    def _minutes(cls, value: Any) -> Any:
+        """Accept "15 minutes" / "1.5h"; anything unreadable becomes None."""
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, float):
+            return round(value)
+        match = _MINUTES_RE.search(str(value))
+        if not match:
+            return None
+        amount = float(match.group(1))
+        unit = (match.group(2) or "m").lower()
+        return round(amount * 60 if unit.startswith("h") else amount)
+
+
+class TaskList(BaseModel):
+    tasks: List[SuggestedTask] = Field(min_length=1, max_length=5)
+
+
+class EmailAnalysis(EmailClassification):
+    """Classification plus suggested tasks from a single call; FYI mail may have no tasks."""
+    tasks: List[SuggestedTask] = Field(default_factory=list, max_length=5)
+
+    @field_validator("tasks", mode="before")
+    @classmethod
+    def _lenient_tasks(cls, value: Any) -> Any:
+        """A bad task must not cost the classification: drop invalid items and keep the first five."""
+        if not isinstance(value, list):
+            return []
+        tasks = []
+        for item in value:
+            try:
+                tasks.append(SuggestedTask.model_validate(item))
+            except ValidationError:
+                continue
+            if len(tasks) == 5:
+                break
+        return tasks
+
+
+def response_format(model: type, name: str) -> Dict[str, Any]:
+    """OpenAI/OpenRouter ``response_format`` requesting output that matches ``model``."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": False, "schema": model.model_json_schema()}}
+
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_LINE_COMMENT_RE = re.compile(r"^\s*//.*$", re.MULTILINE)
+_PY_LITERALS_RE = re.compile(r"\b(True|False|None)\b")
+_UNQUOTED_KEY_RE = re.compile(r"([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)(\s*:)")
+
+
+def repair_json(text: str) -> str:
+    """
+    Cheap textual fixes for almost-JSON model output.
+
+    Strips fences and ``//`` comments, swaps Python literals, quotes bare
+    keys, turns single-quoted strings into double-quoted ones when no double
+    quotes are present, drops trailing commas and closes unbalanced braces or
+    brackets left by truncated replies.
+    """
+    text = text.strip().replace("```json", "").replace("```", "")
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        return text
+    text = _LINE_COMMENT_RE.sub("", text[start:])
+    if '"' not in text:
+        text = text.replace("'", '"')
+    text = _PY_LITERALS_RE.sub(lambda m: {"True": "true", "False": "false", "None": "null"}[m.group(1)], text)
+    text = _UNQUOTED_KEY_RE.sub(r'\1"\2"\3', text)
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    # Close whatever a truncated reply left open (ignoring brackets inside strings)
+    stack: List[str] = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    return _TRAILING_COMMA_RE.sub(r"\1", text + "".join(reversed(stack)))
@@ -0,0 +1,146 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared_state import shared_state
+
+
+def event_content_hash(event: Dict[str, Any]) -> str:
+    """Hash of the event fields that feed the brief prompt."""
+    h = hashlib.sha256()
+    for part in (event.get("title") or "", "\x1f".join(event.get("attendees") or []), event.get("description") or ""):
+        h.update(part.encode("utf-8", errors="ignore"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def _parse_start(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+class BriefService:
+    """
+    Pregenerates meeting briefs shortly before events start.
+
+    Briefs are stored per event id together with a hash of the event content,
+    so a stored brief is only reused while title, attendees and description
+    are unchanged.
+    """
+
+    def __init__(self, calendar_service, get_ai: Callable[[], Any]):
+        self.calendar = calendar_service
+        self._get_ai = get_ai  # resolved per use so the AI client is only built when needed
+        self.lead_minutes = int(os.getenv("BRIEF_LEAD_MINUTES", "30"))
+        self.scan_seconds = float(os.getenv("BRIEF_SCAN_SECONDS", "60"))
+        self.concurrency = max(1, int(os.getenv("BRIEF_CONCURRENCY", "2")))
+        self._briefs: Dict[str, Tuple[str, str]] = {}  # event_id -> (content_hash, brief)
+        self._inflight: set = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logging.getLogger("briefs")
+
+    @property
+    def ai(self):
+        return self._get_ai()
+
+    def get(self, event: Dict[str, Any]) -> Optional[str]:
+        """Return the stored brief if it still matches the event content."""
+        with self._lock:
+            entry = self._briefs.get(event["id"])
+        if entry and entry[0] == event_content_hash(event):
+            return entry[1]
+        return None
+
+    def generate(self, event: Dict[str, Any]) -> Optional[str]:
+        """Generate (and store) a brief for the event synchronously."""
+        if not (self.ai and self.ai.available()):
+            return None
+        content_hash = event_content_hash(event)
+        brief = self.ai.meeting_brief(
+            title=event["title"],
+            when_iso=event["start"],
+            attendees=event["attendees"],
+            description=event.get("description", "")
+        )
+        if brief:
+            with self._lock:
+                self._briefs[event["id"]] = (content_hash, brief)
+        return brief
+
+    def _generate_tracked(self, event: Dict[str, Any]) -> None:
+        try:
+            self.generate(event)
+        except Exception as e:
+            self._logger.warning(f"Brief pregeneration failed for {event.get('id')}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(event["id"])
+
+    def scan_once(self) -> int:
+        """Queue briefs for events starting within the lead window; returns how many were queued."""
+        if not (self.ai and self.ai.available()) or self._executor is None:
+            return 0
+        events = self.calendar.get_upcoming_events()
+        horizon = datetime.datetime.now() + datetime.timedelta(minutes=self.lead_minutes)
+        queued = 0
+        with self._lock:
+            live_ids = {e["id"] for e in events}
+            for stale in [eid for eid in self._briefs if eid not in live_ids]:
+                del self._briefs[stale]
+        for event in events:
+            start = _parse_start(event.get("start"))
+            if start is None or start > horizon or self.get(event) is not None:
+                continue
+            with self._lock:
+                # Stay within the concurrency budget; leftovers are picked up next scan
+                if event["id"] in self._inflight or len(self._inflight) >= self.concurrency:
+                    continue
+                self._inflight.add(event["id"])
+            self._executor.submit(self._generate_tracked, event)
+            queued += 1
+        return queued
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                # With several workers only the lease holder scans, so briefs aren't generated N times
+                if shared_state.acquire_lease("brief-scheduler", self.scan_seconds * 3):
+                    self.scan_once()
+            except Exception as e:
+                self._logger.warning(f"Brief scan failed: {e}")
+            self._stop.wait(self.scan_seconds)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="brief")
+        self._thread = threading.Thread(target=self._run, name="brief-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        try:
+            shared_state.release_lease("brief-scheduler")
+        except Exception:
+            pass
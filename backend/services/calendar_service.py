@@ -1,13 +1,35 @@
+import copy
 import datetime
-from typing import List, Dict, Any, Optional
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class _EventSnapshot:
+    """Cached events for one user and window (days) plus an id -> event index."""
+
+    __slots__ = ("lock", "events", "index", "sync_token", "refreshed_at")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events: List[Dict[str, Any]] = []
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self.sync_token: Optional[str] = None
+        self.refreshed_at: float = 0.0
+
 
 # For now, this is a mock. Later, add Google Calendar API integration.
 class CalendarService:
     def __init__(self):
-        pass
+        self._snapshots: Dict[Tuple[str, int], _EventSnapshot] = {}
+        self._lock = threading.Lock()  # guards the snapshot map only
+        # Snapshots younger than this are served without asking the provider for changes
+        self.refresh_interval = float(os.getenv("CALENDAR_REFRESH_SECONDS", "60"))
 
-    def get_upcoming_events(self, user_id: Optional[str] = None, days: int = 2) -> List[Dict[str, Any]]:
-        """Return a list of upcoming events (mock for now)."""
+    # ---- provider layer -------------------------------------------------
+
+    def _mock_events(self) -> List[Dict[str, Any]]:
         now = datetime.datetime.now()
         return [
             {
@@ -28,9 +50,60 @@ class CalendarService:
             }
         ]
 
-    def get_event(self, event_id: str) -> Optional[Dict[str, Any]]:
-        """Return a single event by ID (mock for now)."""
-        for event in self.get_upcoming_events():
-            if event["id"] == event_id:
-                return event
-        return None
+    def _fetch_changes(self, user_id: Optional[str], days: int, sync_token: Optional[str]) -> Tuple[List[Dict[str, Any]], str, bool]:
+        """
+        Ask the provider for changes since ``sync_token``.
+
+        Returns ``(events, next_sync_token, full)``. When ``full`` is True the
+        events replace the snapshot; otherwise they are a delta where entries
+        with ``status == "cancelled"`` are deletions (Google Calendar semantics).
+        """
+        # Mock: re-anchor relative times once an hour so events stay "upcoming"
+        token = f"mock-{int(time.time() // 3600)}"
+        if sync_token == token:
+            return [], token, False
+        return self._mock_events(), token, True
+
+    # ---- cache layer ----------------------------------------------------
+
+    def _snapshot(self, user_id: Optional[str], days: int = 2) -> _EventSnapshot:
+        # The window is part of the key: a 7-day view must not be served a 2-day snapshot
+        key = (user_id or "default", days)
+        with self._lock:
+            snap = self._snapshots.get(key)
+            if snap is None:
+                snap = self._snapshots[key] = _EventSnapshot()
+        if time.monotonic() - snap.refreshed_at < self.refresh_interval:
+            return snap
+
+        # The provider call holds only this key's lock, so other users and windows
+        # are served meanwhile; concurrent refreshes of the same key coalesce
+        with snap.lock:
+            if time.monotonic() - snap.refreshed_at < self.refresh_interval:
+                return snap
+            changes, next_token, full = self._fetch_changes(user_id, days, snap.sync_token)
+            if full or changes:
+                # Build a new index and swap it in, so lock-free readers never see a half-applied delta
+                index = {} if full else dict(snap.index)
+                for e in changes:
+                    if e.get("status") == "cancelled":
+                        index.pop(e["id"], None)
+                    else:
+                        index[e["id"]] = e
+                snap.index = index
+                snap.events = sorted(index.values(), key=lambda e: e.get("start") or "")
+            snap.sync_token = next_token
+            snap.refreshed_at = time.monotonic()
+            return snap
+
+    # ---- public API -----------------------------------------------------
+
+    def get_upcoming_events(self, user_id: Optional[str] = None, days: int = 2) -> List[Dict[str, Any]]:
+        """Return a list of upcoming events (mock for now), served from the per-user cache."""
+        # Copies, so callers can't mutate the cached events
+        return copy.deepcopy(self._snapshot(user_id, days).events)
+
+    def get_event(self, event_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a copy of a single event by ID via the cached index."""
+        event = self._snapshot(user_id).index.get(event_id)
+        return copy.deepcopy(event) if event is not None else None
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_NUMBER_RE = re.compile(r"\b\w*\d\w*\b")  # any token with a digit: ids, counts, durations
+_WORD_RE = re.compile(r"\w+")
+
+SIMHASH_BITS = 64
+# 8 x 8-bit bands: any pair within 7 bits shares at least one band, so a
+# max_distance above 7 is best-effort
+LSH_BANDS = 8
+
+
+def normalize_text(subject: str, body: str, max_chars: int = 4000) -> List[str]:
+    """Lowercased word tokens with URLs and numbers collapsed to placeholders."""
+    text = f"{subject}\n{body[:max_chars]}".lower()
+    text = _URL_RE.sub(" url ", text)
+    text = _NUMBER_RE.sub(" num ", text)
+    return _WORD_RE.findall(text)
+
+
+def _feature_hash(feature: str) -> int:
+    # Stable across processes (unlike hash()), so workers agree on fingerprints
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: List[str], shingle: int = 1) -> int:
+    """
+    64-bit SimHash over word shingles.
+
+    Unigrams by default: emails are short, and with longer shingles a single
+    swapped name or date moves the fingerprint by 8+ bits.
+    """
+    if not tokens:
+        return 0
+    if len(tokens) < shingle:
+        features = [" ".join(tokens)]
+    else:
+        features = [" ".join(tokens[i:i + shingle]) for i in range(len(tokens) - shingle + 1)]
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        h = _feature_hash(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    fingerprint = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def _bands(fingerprint: int) -> List[Tuple[int, int]]:
+    width = SIMHASH_BITS // LSH_BANDS
+    mask = (1 << width) - 1
+    return [(i, (fingerprint >> (i * width)) & mask) for i in range(LSH_BANDS)]
+
+
+class _UserIndex:
+    __slots__ = ("entries", "buckets")
+
+    def __init__(self):
+        self.entries: Deque[Tuple[int, Dict[str, Any], str]] = deque()
+        self.buckets: Dict[Tuple[int, int], List[Tuple[int, Dict[str, Any], str]]] = {}
+
+
+class _Shard:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users: Dict[str, _UserIndex] = {}
+
+
+class NearDuplicateIndex:
+    """
+    Per-user SimHash/LSH index of already classified messages.
+
+    Users are spread over lock-striped shards so concurrent requests for
+    different users rarely contend. Each user keeps at most ``per_user``
+    recent fingerprints.
+    """
+
+    def __init__(self, shards: int = 16, per_user: int = 5000, max_distance: int = 6):
+        self._shards = [_Shard() for _ in range(shards)]
+        self.per_user = per_user
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def _shard(self, user_id: str) -> _Shard:
+        return self._shards[_feature_hash(user_id) % len(self._shards)]
+
+    def fingerprint(self, subject: str, body: str) -> int:
+        return simhash(normalize_text(subject or "", body or ""))
+
+    def lookup(self, user_id: str, fingerprint: int) -> Optional[Tuple[Dict[str, Any], str, int]]:
+        """Return ``(classification, source_id, distance)`` of the closest match within threshold."""
+        shard = self._shard(user_id)
+        best = None
+        with shard.lock:
+            index = shard.users.get(user_id)
+            if index is not None:
+                for band in _bands(fingerprint):
+                    for fp, classification, source_id in index.buckets.get(band, ()):
+                        distance = bin(fp ^ fingerprint).count("1")
+                        if distance <= self.max_distance and (best is None or distance < best[2]):
+                            best = (classification, source_id, distance)
+        with self._stats_lock:
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def add(self, user_id: str, fingerprint: int, classification: Dict[str, Any], source_id: str = "") -> None:
+        shard = self._shard(user_id)
+        entry = (fingerprint, classification, source_id)
+        with shard.lock:
+            index = shard.users.get(user_id)
+            if index is None:
+                index = shard.users[user_id] = _UserIndex()
+            index.entries.append(entry)
+            for band in _bands(fingerprint):
+                index.buckets.setdefault(band, []).append(entry)
+            while len(index.entries) > self.per_user:
+                old = index.entries.popleft()
+                for band in _bands(old[0]):
+                    bucket = index.buckets.get(band)
+                    if bucket:
+                        for i, candidate in enumerate(bucket):
+                            if candidate is old:
+                                del bucket[i]
+                                break
+                        if not bucket:
+                            del index.buckets[band]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total) if total else 0.0,
+            "users": sum(len(s.users) for s in self._shards),
+            "max_distance": self.max_distance,
+        }
+
+
+# Shared index; LLM calls skipped for messages within DEDUP_MAX_DISTANCE bits of a classified one
+dedup_index = NearDuplicateIndex(
+    shards=int(os.getenv("DEDUP_SHARDS", "16")),
+    per_user=int(os.getenv("DEDUP_PER_USER", "5000")),
+    max_distance=int(os.getenv("DEDUP_MAX_DISTANCE", "6")),
+)
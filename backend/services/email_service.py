@@ -1,13 +1,20 @@
 import imaplib
 import email
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from email import policy
 from email.header import decode_header
-from email.parser import BytesParser
+from email.parser import BytesParser, BytesFeedParser
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 import re
 import html as html_module
 
+from metrics import phase
+
 
 def _decode_header_value(value: Optional[str]) -> str:
     if not value:
@@ -95,6 +102,15 @@ def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
 
 def parse_email_bytes(raw_bytes: bytes) -> Dict[str, Any]:
     msg = BytesParser(policy=policy.default).parsebytes(raw_bytes)
+    return parse_email_message(msg)
+
+
+def new_feed_parser() -> BytesFeedParser:
+    """Incremental parser: ``feed()`` chunks as they arrive, then ``parse_email_message(p.close())``."""
+    return BytesFeedParser(policy=policy.default)
+
+
+def parse_email_message(msg: email.message.EmailMessage) -> Dict[str, Any]:
     subject = _decode_header_value(msg.get("Subject"))
     sender = _decode_header_value(msg.get("From"))
     date_hdr = _decode_header_value(msg.get("Date"))
@@ -110,26 +126,93 @@ def parse_email_bytes(raw_bytes: bytes) -> Dict[str, Any]:
     }
 
 
+# Bulk ingestion parses in the calling (import) thread by default. A process pool is
+# opt-in: pickling messages and results both ways costs more than it saves unless
+# there are spare cores (parse_bench --bulk 1,2,4 on one core: 153/128/141 msgs/sec).
+# 0 means one process per core; larger values are capped at the core count.
+PARSE_POOL_WORKERS = min(int(os.getenv("PARSE_POOL_WORKERS", "1")) or (os.cpu_count() or 1), os.cpu_count() or 1)
+PARSE_POOL_MIN_BATCH = int(os.getenv("PARSE_POOL_MIN_BATCH", "64"))
+PARSE_POOL_CHUNK_SIZE = int(os.getenv("PARSE_POOL_CHUNK_SIZE", "32"))
+# spawn, not fork: the API process runs threads (uvicorn, schedulers)
+PARSE_POOL_START_METHOD = os.getenv("PARSE_POOL_START_METHOD", "spawn")
+
+# One pool per worker count, so ``workers`` really sizes the pool (callers normally use one size)
+_parse_pools: Dict[int, ProcessPoolExecutor] = {}
+_parse_pool_lock = threading.Lock()
+
+
+def _parse_chunk(chunk: List[bytes]) -> List[Dict[str, Any]]:
+    return [parse_email_bytes(raw) for raw in chunk]
+
+
+def _get_parse_pool(workers: int) -> ProcessPoolExecutor:
+    with _parse_pool_lock:
+        pool = _parse_pools.get(workers)
+        if pool is None:
+            pool = _parse_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(PARSE_POOL_START_METHOD),
+            )
+        return pool
+
+
+def shutdown_parse_pool(workers: Optional[int] = None) -> None:
+    """Shut down the pool for ``workers``, or every pool when omitted."""
+    with _parse_pool_lock:
+        sizes = list(_parse_pools) if workers is None else [workers]
+        for size in sizes:
+            pool = _parse_pools.pop(size, None)
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_email_batch(raw_messages: List[bytes], workers: Optional[int] = None, chunk_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Parse many raw messages, returning parsed dicts in input order.
+
+    Batches smaller than PARSE_POOL_MIN_BATCH (or ``workers=1``, the default)
+    are parsed in-process; larger ones are split into chunks over a process
+    pool of ``workers`` processes (PARSE_POOL_WORKERS by default).
+    """
+    workers = PARSE_POOL_WORKERS if workers is None else workers
+    if workers <= 1 or len(raw_messages) < PARSE_POOL_MIN_BATCH:
+        return _parse_chunk(raw_messages)
+    size = chunk_size or max(1, min(PARSE_POOL_CHUNK_SIZE, -(-len(raw_messages) // workers)))
+    chunks = [raw_messages[i:i + size] for i in range(0, len(raw_messages), size)]
+    try:
+        results: List[Dict[str, Any]] = []
+        for parsed in _get_parse_pool(workers).map(_parse_chunk, chunks):
+            results.extend(parsed)
+        return results
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed): reset that pool and parse here
+        shutdown_parse_pool(workers)
+        return _parse_chunk(raw_messages)
+
+
 class EmailService:
     """Lightweight IMAP client for listing and parsing messages."""
 
     def connect(self, host: str, username: str, password: str, port: int = 993, use_ssl: bool = True):
         try:
-            if use_ssl:
-                client = imaplib.IMAP4_SSL(host, port)
-            else:
-                client = imaplib.IMAP4(host, port)
-            client.login(username, password)
+            with phase("imap"):
+                if use_ssl:
+                    client = imaplib.IMAP4_SSL(host, port)
+                else:
+                    client = imaplib.IMAP4(host, port)
+                client.login(username, password)
             return client
         except Exception as e:
             raise RuntimeError(f"IMAP connection/login failed: {e}")
 
     def list_messages(self, client, mailbox: str = "INBOX", limit: int = 5) -> List[Dict[str, Any]]:
         try:
-            typ, _ = client.select(mailbox, readonly=True)
+            with phase("imap"):
+                typ, _ = client.select(mailbox, readonly=True)
             if typ != "OK":
                 raise RuntimeError(f"Unable to select mailbox {mailbox}")
-            typ, data = client.search(None, "ALL")
+            with phase("imap"):
+                typ, data = client.search(None, "ALL")
             if typ != "OK":
                 raise RuntimeError("Search failed")
             ids = (data[0] or b"").split()
@@ -139,7 +222,8 @@ class EmailService:
             ids = ids[-limit:]
             results: List[Dict[str, Any]] = []
             for msg_id in ids[::-1]:  # newest first
-                ftyp, msg_data = client.fetch(msg_id, "(RFC822)")
+                with phase("imap"):
+                    ftyp, msg_data = client.fetch(msg_id, "(RFC822)")
                 if ftyp != "OK" or not msg_data or not msg_data[0]:
                     continue
                 raw_bytes = msg_data[0][1]
@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.mail_import import MailImporter
+from shared_state import shared_state
+
+GMAIL_API_BASE = os.getenv("GMAIL_API_BASE", "https://gmail.googleapis.com")
+# Gmail accepts up to 100 calls per batch but throttles large ones; 50 is the documented sweet spot
+GMAIL_BATCH_SIZE = max(1, min(int(os.getenv("GMAIL_BATCH_SIZE", "50")), 100))
+GMAIL_MESSAGE_FORMAT = os.getenv("GMAIL_MESSAGE_FORMAT", "metadata")  # metadata | minimal
+GMAIL_INITIAL_SYNC_LIMIT = int(os.getenv("GMAIL_INITIAL_SYNC_LIMIT", "100"))
+GMAIL_TIMEOUT = float(os.getenv("GMAIL_TIMEOUT", "30"))
+# Per-account lease so a manual sync and a scheduled one never run together (any worker)
+GMAIL_SYNC_LEASE_SECONDS = float(os.getenv("GMAIL_SYNC_LEASE_SECONDS", "600"))
+METADATA_HEADERS = ("Subject", "From", "Date", "Message-ID")
+
+_STATUS_RE = re.compile(r"^HTTP/\d(?:\.\d)? (\d{3})", re.MULTILINE)
+_CONTENT_ID_RE = re.compile(r"^Content-ID:\s*<?response-([^>\s]+)>?", re.IGNORECASE | re.MULTILINE)
+
+
+class GmailAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Gmail API {status}: {message}")
+        self.status = status
+
+
+class HistoryExpired(GmailAPIError):
+    """The stored historyId is too old for ``history.list``; a full resync is needed."""
+
+
+def _raise_for(resp) -> None:
+    if resp.status_code < 400:
+        return
+    try:
+        message = resp.json().get("error", {}).get("message", resp.text)
+    except ValueError:
+        message = resp.text
+    raise GmailAPIError(resp.status_code, str(message)[:200])
+
+
+def message_to_email(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a ``metadata``/``minimal`` Gmail message onto the parsed-email dict used elsewhere."""
+    headers = {h["name"].lower(): h["value"] for h in (msg.get("payload") or {}).get("headers", [])}
+    internal = msg.get("internalDate")
+    return {
+        "id": msg["id"],
+        "thread_id": msg.get("threadId"),
+        "subject": headers.get("subject", ""),
+        "sender": headers.get("from", ""),
+        "timestamp": datetime.fromtimestamp(int(internal) / 1000, timezone.utc) if internal else None,
+        # Neither format carries the body; Gmail's snippet is enough for triage
+        "body": msg.get("snippet", ""),
+        "labels": msg.get("labelIds", []),
+    }
+
+
+class GmailClient:
+    """Thin Gmail REST client for one mailbox (``users/me``) over a shared httpx client."""
+
+    def __init__(self, http_client, access_token: str, base_url: str = GMAIL_API_BASE):
+        self.http = http_client
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.requests = 0
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.requests += 1
+        resp = self.http.get(f"{self.base_url}/gmail/v1/users/me/{path}", params=params, headers=self._headers())
+        _raise_for(resp)
+        return resp.json()
+
+    def profile(self) -> Dict[str, Any]:
+        return self._get("profile")
+
+    def list_message_ids(self, limit: int, query: Optional[str] = None) -> List[str]:
+        """Newest message ids, following pages up to ``limit``."""
+        ids: List[str] = []
+        page_token = None
+        while len(ids) < limit:
+            params: Dict[str, Any] = {"maxResults": min(500, limit - len(ids))}
+            if query:
+                params["q"] = query
+            if page_token:
+                params["pageToken"] = page_token
+            data = self._get("messages", params)
+            ids.extend(m["id"] for m in data.get("messages", []))
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                break
+        return ids[:limit]
+
+    def added_since(self, start_history_id: str) -> Tuple[List[str], str]:
+        """Ids of messages added after ``start_history_id`` and the mailbox's current historyId."""
+        ids: List[str] = []
+        seen = set()
+        page_token = None
+        latest = start_history_id
+        while True:
+            params: Dict[str, Any] = {"startHistoryId": start_history_id, "historyTypes": "messageAdded", "maxResults": 500}
+            if page_token:
+                params["pageToken"] = page_token
+            try:
+                data = self._get("history", params)
+            except GmailAPIError as e:
+                if e.status == 404:
+                    raise HistoryExpired(e.status, "startHistoryId is no longer available") from e
+                raise
+            for entry in data.get("history", []):
+                for added in entry.get("messagesAdded", []):
+                    msg_id = added["message"]["id"]
+                    if msg_id not in seen:
+                        seen.add(msg_id)
+                        ids.append(msg_id)
+            latest = data.get("historyId", latest)
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return ids, latest
+
+    def get_messages(self, ids: Iterable[str], fmt: str = GMAIL_MESSAGE_FORMAT,
+                     failed: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        ``messages.get`` for many ids via the batch endpoint, GMAIL_BATCH_SIZE calls per request.
+
+        Ids that still fail after one retry (other than deleted messages) are
+        appended to ``failed`` when given.
+        """
+        ids = list(ids)
+        messages: List[Dict[str, Any]] = []
+        for start in range(0, len(ids), GMAIL_BATCH_SIZE):
+            chunk = ids[start:start + GMAIL_BATCH_SIZE]
+            results = self._batch_get(chunk, fmt)
+            retry = [i for i in chunk if i not in results]
+            for msg_id in retry:
+                # Per-part 429/5xx inside a batch: one individual retry, then give up on that message
+                try:
+                    results[msg_id] = self._get(f"messages/{msg_id}", self._format_params(fmt))
+                except GmailAPIError as e:
+                    logging.getLogger("gmail_sync").info(f"Skipping message {msg_id}: {e}")
+                    if failed is not None and e.status != 404:
+                        failed.append(msg_id)
+            messages.extend(results[i] for i in chunk if i in results)
+        return messages
+
+    @staticmethod
+    def _format_params(fmt: str) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"format": fmt}
+        if fmt == "metadata":
+            params["metadataHeaders"] = list(METADATA_HEADERS)
+        return params
+
+    def _batch_get(self, ids: List[str], fmt: str) -> Dict[str, Dict[str, Any]]:
+        """One multipart/mixed batch request; returns successfully fetched messages by id."""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        query = f"format={fmt}" + ("".join(f"&metadataHeaders={h}" for h in METADATA_HEADERS) if fmt == "metadata" else "")
+        parts = [
+            f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <{msg_id}>\r\n\r\n"
+            f"GET /gmail/v1/users/me/messages/{msg_id}?{query}\r\n\r\n"
+            for msg_id in ids
+        ]
+        body = "".join(parts) + f"--{boundary}--\r\n"
+        self.requests += 1
+        resp = self.http.post(
+            f"{self.base_url}/batch/gmail/v1",
+            content=body.encode("utf-8"),
+            headers={**self._headers(), "Content-Type": f"multipart/mixed; boundary={boundary}"},
+        )
+        _raise_for(resp)
+        return self._parse_batch(resp.text, resp.headers.get("content-type", ""))
+
+    @staticmethod
+    def _parse_batch(text: str, content_type: str) -> Dict[str, Dict[str, Any]]:
+        boundary = content_type.partition("boundary=")[2].strip('"')
+        results: Dict[str, Dict[str, Any]] = {}
+        for part in text.split(f"--{boundary}"):
+            status = _STATUS_RE.search(part)
+            if not status or status.group(1) != "200":
+                continue
+            # JSON payload follows the blank line after the inner response headers
+            payload = part[status.end():].split("\r\n\r\n", 1)[-1].strip()
+            try:
+                msg = json.loads(payload)
+            except ValueError:
+                continue
+            content_id = _CONTENT_ID_RE.search(part)
+            results[content_id.group(1) if content_id else msg.get("id")] = msg
+        return results
+
+
+class GmailSyncEngine:
+    """
+    Incremental Gmail sync for accounts linked through Google OAuth.
+
+    The first sync lists the newest GMAIL_INITIAL_SYNC_LIMIT messages and
+    records the mailbox historyId; later syncs ask ``history.list`` for
+    messages added since then, so an idle mailbox costs one small request.
+    Messages are fetched with batched ``messages.get`` in ``metadata`` (or
+    ``minimal``) format and stored as StoredEmail rows with source ``gmail``.
+    """
+
+    PROVIDER = "gmail"
+
+    def __init__(self, session_factory=None, account_model=None, email_model=None, token_store=None, http_client=None):
+        self.tokens = token_store
+        self._session_factory = session_factory
+        self._account_model = account_model
+        self._email_model = email_model
+        self._importer = MailImporter(session_factory, email_model)
+        self._http = http_client
+        self._owns_http = http_client is None
+        self._table_ready = False
+        self._logger = logging.getLogger("gmail_sync")
+
+    @property
+    def http(self):
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.Client(timeout=httpx.Timeout(GMAIL_TIMEOUT, connect=10.0),
+                                      limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+        return self._http
+
+    def close(self) -> None:
+        if self._owns_http and self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def available(self) -> bool:
+        return self._session_factory is not None and self._account_model is not None and self.tokens is not None
+
+    def _session(self):
+        session = self._session_factory()
+        if not self._table_ready:
+            from database import ensure_table
+
+            ensure_table(self._account_model.__table__, session.get_bind())
+            self._table_ready = True
+        return session
+
+    def sync_account(self, account_id: str) -> Dict[str, Any]:
+        """
+        Fetch and store new mail for one account; returns what was done.
+
+        Skipped (``"skipped": True``, nothing stored) while another sync of the
+        same account holds its lease.
+        """
+        lease, owner = f"gmail-sync:{account_id}", f"{shared_state.owner}-{threading.get_ident()}"
+        try:
+            if not shared_state.acquire_lease(lease, GMAIL_SYNC_LEASE_SECONDS, owner):
+                return {"account_id": account_id, "skipped": True, "fetched": 0, "stored": 0}
+        except sqlite3.Error as e:
+            self._logger.warning(f"Gmail sync lease unavailable: {e}")
+            owner = None
+        try:
+            return self._sync_account(account_id)
+        finally:
+            if owner:
+                try:
+                    shared_state.release_lease(lease, owner)
+                except sqlite3.Error:
+                    pass
+
+    def _sync_account(self, account_id: str) -> Dict[str, Any]:
+        session = self._session()
+        try:
+            account = session.get(self._account_model, account_id)
+            if account is None or account.provider != self.PROVIDER:
+                raise ValueError(f"No Gmail account {account_id}")
+            # Tokens come from the store's cache; its refresher keeps them ahead of expiry
+            client = GmailClient(self.http, self.tokens.access_token(account.id))
+            try:
+                mode, ids, history_id = self._changes(client, account.history_id)
+            except GmailAPIError as e:
+                if e.status != 401:
+                    raise
+                client.access_token = self.tokens.refresh(account.id).access_token
+                mode, ids, history_id = self._changes(client, account.history_id)
+            ids = self._unseen(session, account.id, ids)
+            failed: List[str] = []
+            messages = [message_to_email(m) for m in client.get_messages(ids, failed=failed)] if ids else []
+            stored = self._importer.store(account.user_id, messages, source=self.PROVIDER, account_id=account.id)
+            if failed:
+                # Keep the old cursor so the next run lists these again; stored ids are skipped by _unseen
+                self._logger.warning(f"{len(failed)} messages of account {account.id} failed; not advancing historyId")
+            else:
+                account.history_id = history_id
+            account.last_sync = datetime.now(timezone.utc)
+            session.commit()
+            return {
+                "account_id": account.id, "email_address": account.email_address, "mode": mode,
+                "fetched": len(messages), "stored": stored, "failed": len(failed),
+                "history_id": account.history_id, "api_requests": client.requests,
+            }
+        finally:
+            session.close()
+
+    def _unseen(self, session, account_id: str, ids: List[str]) -> List[str]:
+        """Drop ids already stored for this account (resyncs relist recent mail)."""
+        model = self._email_model
+        if not ids or model is None:
+            return ids
+        try:
+            known = {row[0] for row in session.query(model.message_id).filter(
+                model.account_id == account_id, model.message_id.in_(ids)
+            )}
+        except Exception:
+            return ids  # emails table not created yet
+        return [i for i in ids if i not in known]
+
+    def _changes(self, client: GmailClient, history_id: Optional[str]) -> Tuple[str, List[str], str]:
+        if history_id:
+            try:
+                ids, latest = client.added_since(history_id)
+                return "incremental", ids, latest
+            except HistoryExpired:
+                self._logger.info("Stored historyId expired; resyncing recent mail")
+                mode = "resync"
+        else:
+            mode = "initial"
+        # Read the historyId first so mail arriving during the listing is picked up next time
+        latest = str(client.profile()["historyId"])
+        return mode, client.list_message_ids(GMAIL_INITIAL_SYNC_LIMIT), latest
+
+    def sync_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Sync every active Gmail account of ``user_id``; per-account errors are reported, not raised."""
+        model = self._account_model
+        session = self._session()
+        try:
+            account_ids = [row.id for row in session.query(model.id).filter(
+                model.user_id == user_id, model.provider == self.PROVIDER, model.is_active.is_(True)
+            )]
+        finally:
+            session.close()
+        results = []
+        for account_id in account_ids:
+            try:
+                results.append(self.sync_account(account_id))
+            except Exception as e:
+                self._logger.warning(f"Gmail sync failed for account {account_id}: {e}")
+                results.append({"account_id": account_id, "error": str(e)})
+        return results
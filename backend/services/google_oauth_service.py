@@ -1,11 +1,11 @@
 import os
 from urllib.parse import urlencode
-from google_auth_oauthlib.flow import Flow
 from fastapi import Request
 
 GOOGLE_CLIENT_ID = os.getenv("GMAIL_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GMAIL_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GMAIL_REDIRECT_URI", "http://localhost:9000/auth/google/callback")
+GOOGLE_TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI", "https://oauth2.googleapis.com/token")
 GOOGLE_SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
     "https://www.googleapis.com/auth/userinfo.email",
@@ -14,6 +14,8 @@ GOOGLE_SCOPES = [
 
 
 def get_google_auth_flow(state=None):
+    # Deferred: google_auth_oauthlib is slow to import and only needed for the OAuth flow
+    from google_auth_oauthlib.flow import Flow
     return Flow(
         client_type="web",
         client_config={
@@ -22,7 +24,7 @@ def get_google_auth_flow(state=None):
                 "client_secret": GOOGLE_CLIENT_SECRET,
                 "redirect_uris": [GOOGLE_REDIRECT_URI],
                 "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "token_uri": GOOGLE_TOKEN_URI,
             }
         },
         scopes=GOOGLE_SCOPES,
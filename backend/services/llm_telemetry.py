@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+def _usage_tokens(usage: Any) -> tuple:
+    """Extract (prompt, completion) token counts from chat or responses usage objects."""
+    if usage is None:
+        return 0, 0
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(usage, "input_tokens", 0)
+    completion = getattr(usage, "completion_tokens", None)
+    if completion is None:
+        completion = getattr(usage, "output_tokens", 0)
+    return int(prompt or 0), int(completion or 0)
+
+
+class LLMTelemetry:
+    """
+    Structured per-call telemetry for OpenRouter requests.
+
+    Keeps the most recent calls in a ring buffer and running totals per task
+    type (the keys of ``OpenRouterService.model_config``).
+    """
+
+    def __init__(self, buffer_size: int = 200):
+        self._recent: deque = deque(maxlen=buffer_size)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._parse: Dict[str, Dict[str, int]] = {}  # model -> outcome counts
+        self._lock = threading.Lock()
+
+    def start(self, task: Optional[str], requested_model: Optional[str]) -> Dict[str, Any]:
+        return {
+            "task": task or "adhoc",
+            "requested_model": requested_model,
+            "model": None,
+            "path": None,  # "chat" | "responses" | "cache"
+            "models_tried": [],
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "chat_seconds": 0.0,
+            "responses_seconds": 0.0,
+            "rate_wait_seconds": 0.0,
+            "errors": 0,
+            "started_at": time.time(),
+            "_t0": time.perf_counter(),
+        }
+
+    def add_usage(self, call: Dict[str, Any], usage: Any) -> None:
+        prompt, completion = _usage_tokens(usage)
+        call["prompt_tokens"] += prompt
+        call["completion_tokens"] += completion
+
+    def finish(self, call: Dict[str, Any], ok: bool) -> None:
+        record = {k: v for k, v in call.items() if not k.startswith("_")}
+        record["ok"] = ok
+        record["fallbacks"] = max(0, len(call["models_tried"]) - 1)
+        record["total_seconds"] = time.perf_counter() - call["_t0"]
+        with self._lock:
+            self._recent.append(record)
+            agg = self._tasks.get(record["task"])
+            if agg is None:
+                agg = self._tasks[record["task"]] = {
+                    "calls": 0, "ok": 0, "failed": 0, "fallbacks": 0, "responses_fallbacks": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0,
+                    "chat_seconds": 0.0, "responses_seconds": 0.0, "total_seconds": 0.0,
+                    "rate_wait_seconds": 0.0, "cache_hits": 0, "errors": 0, "by_model": {},
+                    "body_tokens_original": 0, "body_tokens_sent": 0, "body_tokens_saved": 0,
+                }
+            agg["calls"] += 1
+            agg["ok" if ok else "failed"] += 1
+            agg["fallbacks"] += record["fallbacks"]
+            agg["responses_fallbacks"] += 1 if record["path"] == "responses" else 0
+            agg["cache_hits"] += 1 if record["path"] == "cache" else 0
+            agg["errors"] += record["errors"]
+            for key in ("prompt_tokens", "completion_tokens", "chat_seconds", "responses_seconds", "total_seconds", "rate_wait_seconds"):
+                agg[key] += record[key]
+            # Prompt compaction accounting (email tasks only)
+            for key in ("body_tokens_original", "body_tokens_sent", "body_tokens_saved"):
+                agg[key] += record.get(key, 0)
+            if record["model"]:
+                agg["by_model"][record["model"]] = agg["by_model"].get(record["model"], 0) + 1
+
+    def record_parse(self, model: str, task: Optional[str], outcome: str) -> None:
+        """Count a structured reply as ``ok``, ``repaired`` or ``failed`` for ``model``."""
+        with self._lock:
+            counts = self._parse.setdefault(model, {"ok": 0, "repaired": 0, "failed": 0})
+            counts[outcome] += 1
+
+    def parse_summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            parse = {model: dict(counts) for model, counts in self._parse.items()}
+        for counts in parse.values():
+            total = counts["ok"] + counts["repaired"] + counts["failed"]
+            counts["failure_rate"] = counts["failed"] / total if total else 0.0
+            counts["repair_rate"] = counts["repaired"] / total if total else 0.0
+        return parse
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            tasks = {name: {**agg, "by_model": dict(agg["by_model"])} for name, agg in self._tasks.items()}
+        totals = {
+            "calls": sum(t["calls"] for t in tasks.values()),
+            "failed": sum(t["failed"] for t in tasks.values()),
+            "fallbacks": sum(t["fallbacks"] for t in tasks.values()),
+            "cache_hits": sum(t["cache_hits"] for t in tasks.values()),
+            "body_tokens_saved": sum(t["body_tokens_saved"] for t in tasks.values()),
+            "prompt_tokens": sum(t["prompt_tokens"] for t in tasks.values()),
+            "completion_tokens": sum(t["completion_tokens"] for t in tasks.values()),
+        }
+        for t in tasks.values():
+            t["avg_seconds"] = t["total_seconds"] / t["calls"] if t["calls"] else 0.0
+        return {"totals": totals, "tasks": tasks, "parse": self.parse_summary()}
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._recent)
+        return items[-limit:] if limit else items
+
+
+# Shared by every OpenRouterService instance so stats cover all AI traffic
+llm_telemetry = LLMTelemetry(int(os.getenv("LLM_TELEMETRY_BUFFER", "200")))
@@ -0,0 +1,294 @@
+import logging
+import mmap
+import os
+import re
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from services.email_service import parse_email_batch
+from shared_state import shared_state
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_READ_CHUNK = 1 << 20  # 1 MiB
+IMPORT_IDLE_SECONDS = float(os.getenv("IMPORT_IDLE_SECONDS", "60"))
+# A running job not saved for this long belongs to a dead worker and is claimed again
+IMPORT_STALE_SECONDS = float(os.getenv("IMPORT_STALE_SECONDS", "300"))
+# Largest accepted upload for /email/import (larger requests get a 413)
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1 << 30)))
+
+# mboxrd quoting: a body line ">From " (any number of ">") was written with one extra ">"
+_QUOTED_FROM = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+ProgressFn = Callable[[int, int], None]
+
+
+def iter_mbox(path: str, progress: Optional[ProgressFn] = None) -> Iterator[bytes]:
+    """
+    Yield raw messages from an mbox file.
+
+    The file is memory-mapped and split on ``From `` separator lines, so only
+    one message is copied out at a time regardless of archive size. Body lines
+    quoted as ``>From `` are unquoted (mboxrd).
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:5] == b"From ":
+            start = 0
+        else:
+            sep = mm.find(b"\nFrom ")
+            if sep == -1:
+                return
+            start = sep + 1
+        while start < size:
+            sep = mm.find(b"\nFrom ", start + 5)
+            end = size if sep == -1 else sep + 1
+            line_end = mm.find(b"\n", start, end)
+            body_start = end if line_end == -1 else line_end + 1
+            if body_start < end:
+                raw = mm[body_start:end]
+                yield _QUOTED_FROM.sub(rb"\1", raw) if b">From " in raw else raw
+            if progress:
+                progress(end, size)
+            start = end
+
+
+def _is_maildir_message(name: str) -> bool:
+    parts = name.replace("\\", "/").rstrip("/").split("/")
+    return len(parts) >= 2 and parts[-2] in ("cur", "new") and not parts[-1].startswith(".")
+
+
+def iter_maildir_archive(path: str, progress: Optional[ProgressFn] = None) -> Iterator[bytes]:
+    """Yield raw messages from a zip or (optionally compressed) tar of a Maildir tree."""
+    size = os.path.getsize(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            done = 0
+            for info in zf.infolist():
+                done += info.compress_size
+                if not info.is_dir() and _is_maildir_message(info.filename):
+                    yield zf.read(info)
+                if progress:
+                    progress(done, size)
+        return
+    with open(path, "rb") as f, tarfile.open(fileobj=f, mode="r|*") as tf:
+        # Stream mode: members are read sequentially, never all at once
+        for member in tf:
+            if member.isfile() and _is_maildir_message(member.name):
+                handle = tf.extractfile(member)
+                if handle is not None:
+                    yield handle.read()
+            if progress:
+                progress(f.tell(), size)
+
+
+class _JobLost(Exception):
+    """The job was reclaimed by another worker while this one was still running it."""
+
+
+class ImportJob:
+    def __init__(self, user_id: str, fmt: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.format = fmt
+        self.path = path
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.bytes_total = os.path.getsize(path) if os.path.exists(path) else 0
+        self.bytes_processed = 0
+        self.messages_parsed = 0
+        self.messages_stored = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self) -> Dict[str, Any]:
+        """Serializable state kept in the shared job table."""
+        return {k: v for k, v in vars(self).items() if k not in ("id", "status")}
+
+    @classmethod
+    def from_record(cls, job_id: str, status: str, record: Dict[str, Any]) -> "ImportJob":
+        job = cls.__new__(cls)
+        job.__dict__.update(record)
+        job.id = job_id
+        job.status = status
+        return job
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "format": self.format,
+            "status": self.status,
+            "error": self.error,
+            "bytes_total": self.bytes_total,
+            "bytes_processed": self.bytes_processed,
+            "progress": (self.bytes_processed / self.bytes_total) if self.bytes_total else 1.0,
+            "messages_parsed": self.messages_parsed,
+            "messages_stored": self.messages_stored,
+            "elapsed_seconds": elapsed,
+            "messages_per_sec": (self.messages_parsed / elapsed) if elapsed else 0.0,
+        }
+
+
+class MailImporter:
+    """
+    Runs archive imports in the background: read -> batch parse -> bulk insert.
+
+    Jobs live in the shared job table (see shared_state.py), so with several
+    workers any of them can report progress and an idle worker's consumer
+    thread may pick up a job another worker accepted. A job left running by a
+    worker that died is reclaimed after IMPORT_STALE_SECONDS and resumes after
+    the messages it already stored. Uploads are spooled to the local temp dir,
+    so all workers must share a host.
+    """
+
+    FORMATS = ("mbox", "maildir")
+    KIND = "mail_import"
+
+    def __init__(self, session_factory=None, model=None, batch_size: int = IMPORT_BATCH_SIZE, state=None):
+        self._session_factory = session_factory
+        self._model = model
+        self.batch_size = batch_size
+        self._state = state or shared_state
+        self._consumer: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._logger = logging.getLogger("mail_import")
+
+    def start(self, user_id: str, fmt: str, path: str) -> ImportJob:
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        job = ImportJob(user_id, fmt, path)
+        self._state.job_put(job.id, self.KIND, job.record())
+        self._ensure_consumer()
+        self._wake.set()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        record = self._state.job_get(job_id)
+        if record is None:
+            return None
+        status = record.pop("status")
+        if status == "running":
+            # Pollers keep a consumer alive here, so a dead worker's job gets reclaimed
+            self._ensure_consumer()
+        return ImportJob.from_record(job_id, status, record)
+
+    def _ensure_consumer(self) -> None:
+        with self._lock:
+            if self._consumer is None or not self._consumer.is_alive():
+                self._consumer = threading.Thread(target=self._consume, name="mail-import", daemon=True)
+                self._consumer.start()
+
+    def _consume(self) -> None:
+        """Claim queued jobs one at a time; exit after IMPORT_IDLE_SECONDS without work."""
+        idle_since = time.monotonic()
+        while time.monotonic() - idle_since < IMPORT_IDLE_SECONDS:
+            record = self._state.job_claim(self.KIND, stale_after=IMPORT_STALE_SECONDS)
+            if record is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            job_id, status = record.pop("id"), record.pop("status")
+            self._run(ImportJob.from_record(job_id, status, record))
+            idle_since = time.monotonic()
+
+    def _save(self, job: ImportJob, status: Optional[str] = None) -> None:
+        if not self._state.job_update(job.id, job.record(), status):
+            raise _JobLost(job.id)
+
+    def _run(self, job: ImportJob) -> None:
+        # A reclaimed job skips what its previous worker stored (at most one batch may repeat)
+        if self._session_factory is not None:
+            job.messages_parsed = job.messages_stored
+        resume = job.messages_parsed
+        job.status = "running"
+        job.started_at = job.started_at or time.time()
+        last_saved = time.monotonic()
+
+        def progress(done: int, total: int) -> None:
+            nonlocal last_saved
+            job.bytes_processed = done
+            # Throttle shared-state writes; pollers see progress at ~2 Hz
+            if time.monotonic() - last_saved >= 0.5:
+                self._save(job)
+                last_saved = time.monotonic()
+
+        source = iter_mbox if job.format == "mbox" else iter_maildir_archive
+        try:
+            self._save(job)
+            batch: List[bytes] = []
+            for raw in source(job.path, progress):
+                if resume:
+                    resume -= 1
+                    continue
+                batch.append(raw)
+                if len(batch) >= self.batch_size:
+                    self._flush(job, batch)
+                    batch = []
+            if batch:
+                self._flush(job, batch)
+            job.bytes_processed = job.bytes_total
+            job.status = "completed"
+        except _JobLost:
+            # The new owner resumes from the saved progress and needs the upload
+            self._logger.warning(f"Import {job.id} was reclaimed by another worker; stopping")
+            return
+        except Exception as e:
+            self._logger.warning(f"Import {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = time.time()
+        try:
+            self._save(job, job.status)
+        except _JobLost:
+            self._logger.warning(f"Import {job.id} was reclaimed by another worker before it finished")
+            return
+        # Only the owner that recorded the final status removes the upload
+        try:
+            os.unlink(job.path)
+        except OSError:
+            pass
+
+    def _flush(self, job: ImportJob, batch: List[bytes]) -> None:
+        parsed = parse_email_batch(batch)
+        job.messages_parsed += len(parsed)
+        job.messages_stored += self.store(job.user_id, parsed, source=job.format)
+        self._save(job)  # doubles as the heartbeat and the resume point
+
+    def store(self, user_id: str, parsed: List[Dict[str, Any]], source: str, account_id: Optional[str] = None) -> int:
+        """Bulk-insert parsed messages; a no-op when no database is configured."""
+        if not parsed or self._session_factory is None or self._model is None:
+            return 0
+        from sqlalchemy import insert
+
+        now = datetime.now(timezone.utc)
+        rows = [{
+            "user_id": user_id,
+            "account_id": account_id,
+            "message_id": m.get("id") or None,
+            "subject": m.get("subject", ""),
+            "sender": (m.get("sender") or "")[:512],
+            "received_at": m.get("timestamp") or now,
+            "body": m.get("body", ""),
+            "source": source,
+        } for m in parsed]
+        session = self._session_factory()
+        try:
+            if not self._table_ready:
+                from database import ensure_table
+
+                ensure_table(self._model.__table__, session.get_bind())
+                self._table_ready = True
+            session.execute(insert(self._model), rows)
+            session.commit()
+        finally:
+            session.close()
+        return len(rows)
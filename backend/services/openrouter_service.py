@@ -1,8 +1,21 @@
 import os
 import json
+import hashlib
 import importlib
 import logging
-from typing import List, Optional
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from json_utils import extract_json
+from metrics import phase
+from services.prompt_compactor import prepare_body
+from services.ai_schemas import EmailAnalysis, EmailClassification, TaskList, repair_json, response_format as schema_format
+from services.llm_telemetry import llm_telemetry
+from shared_state import RateLimiter, shared_state
 
 # Dynamically resolve OpenAI client to avoid static import errors if not installed yet
 OpenAI = None
@@ -13,6 +26,81 @@ try:
 except Exception:
     OpenAI = None
 
+# Shared connection pool for all AI traffic (one OpenRouterService per process)
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+OPENROUTER_MAX_KEEPALIVE = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "10"))
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "true").lower() in ("1", "true", "yes")
+OPENROUTER_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "60"))
+
+# Cross-worker LLM response cache and provider rate limit (see shared_state.py)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds; 0 disables
+LLM_SINGLEFLIGHT_WAIT = float(os.getenv("LLM_SINGLEFLIGHT_WAIT", "60"))
+OPENROUTER_RATE_LIMIT = float(os.getenv("OPENROUTER_RATE_LIMIT", "0"))  # requests/sec for all workers; 0 = unlimited
+OPENROUTER_RATE_BURST = float(os.getenv("OPENROUTER_RATE_BURST", "5"))
+OPENROUTER_RATE_WAIT = float(os.getenv("OPENROUTER_RATE_WAIT", "30"))
+
+CLASSIFICATION_FORMAT = schema_format(EmailClassification, "email_classification")
+TASKS_FORMAT = schema_format(TaskList, "task_list")
+ANALYSIS_FORMAT = schema_format(EmailAnalysis, "email_analysis")
+
+# classify_email / suggest_tasks answered from one combined analyze_email call per email
+ANALYZE_COMBINED = os.getenv("ANALYZE_COMBINED", "true").lower() in ("1", "true", "yes")
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "3600"))
+
+# Structured output: json_schema -> json_object -> off, per model, on rejection
+_STRUCTURED_MODES = ("json_schema", "json_object", "off")
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "json_schema")
+if STRUCTURED_OUTPUT not in _STRUCTURED_MODES:
+    STRUCTURED_OUTPUT = "off"
+
+_rate_limiter = RateLimiter(shared_state, "openrouter", OPENROUTER_RATE_LIMIT, OPENROUTER_RATE_BURST)
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """A 400/422 that blames the structured-output request itself, not the prompt or parameters."""
+    if getattr(error, "status_code", None) not in (400, 422) and type(error).__name__ != "BadRequestError":
+        return False
+    detail = f"{error} {getattr(error, 'body', '') or ''}".lower()
+    return any(k in detail for k in ("response_format", "json_schema", "json_object", "structured output"))
+
+
+def _cache_key(model: Optional[str], messages: List[dict], temperature: float, max_tokens: int,
+               response_format: Optional[dict] = None) -> str:
+    payload = json.dumps([model, messages, temperature, max_tokens, response_format], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _analysis_key(subject: str, body: str, sender: str) -> str:
+    payload = json.dumps([subject, sender, body], ensure_ascii=False)
+    return "analysis:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _http2_supported() -> bool:
+    if not OPENROUTER_HTTP2:
+        return False
+    try:
+        importlib.import_module("h2")
+        return True
+    except ImportError:
+        logging.getLogger("openrouter").info("h2 not installed; using HTTP/1.1 keep-alive")
+        return False
+
+
+def build_http_client(http2: bool):
+    """httpx client with the tuned shared pool."""
+    import httpx
+
+    return httpx.Client(
+        http2=http2,
+        timeout=httpx.Timeout(OPENROUTER_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE,
+            keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+        ),
+    )
+
 
 class OpenRouterService:
     """
@@ -27,6 +115,10 @@ class OpenRouterService:
         self.fallback_model = os.getenv("FALLBACK_MODEL", "mistralai/mistral-7b-instruct:free")
 
         self.client = None
+        self.http_client = None
+        # model -> structured output mode, stepped down when a model rejects response_format
+        self.structured_modes: dict = {}
+        self.http2 = False
         if OpenAI and self.api_key:
             try:
                 # Add recommended headers for OpenRouter
@@ -34,10 +126,13 @@ class OpenRouterService:
                     "HTTP-Referer": os.getenv("OPENROUTER_REFERRER", "http://localhost:9000"),
                     "X-Title": os.getenv("OPENROUTER_TITLE", "Brody Dev"),
                 }
+                self.http2 = _http2_supported()
+                self.http_client = build_http_client(self.http2)
                 self.client = OpenAI(
                     api_key=self.api_key,
                     base_url=self.base_url,
                     default_headers=default_headers,
+                    http_client=self.http_client,
                 )
             except Exception:
                 self.client = None
@@ -51,13 +146,87 @@ class OpenRouterService:
         self.model_config = {
             "email_classification": os.getenv("EMAIL_MODEL", self.default_model),
             "task_generation": os.getenv("TASK_MODEL", self.default_model),
+            "email_analysis": os.getenv("ANALYSIS_MODEL", self.default_model),
             "meeting_brief": os.getenv("MEETING_MODEL", self.default_model),
             "summarization": os.getenv("SUMMARY_MODEL", self.fallback_model),
         }
+        # Task → email body token budget (after compaction), replacing the fixed body[:2000] slice
+        self.token_budgets = {
+            "email_classification": int(os.getenv("EMAIL_TOKEN_BUDGET", "300")),
+            "task_generation": int(os.getenv("TASK_TOKEN_BUDGET", "600")),
+            "email_analysis": int(os.getenv("ANALYSIS_TOKEN_BUDGET", "600")),
+        }
 
     def available(self) -> bool:
         return self.client is not None
 
+    def _email_body(self, body: str, task: str) -> Tuple[str, dict]:
+        """Compacted, budgeted body for ``task`` plus its token accounting."""
+        return prepare_body(body or "", self.token_budgets.get(task, 500))
+
+    def _response_format_for(self, model: str, response_format: Optional[dict]) -> Optional[dict]:
+        mode = self.structured_modes.get(model, STRUCTURED_OUTPUT)
+        if not response_format or mode == "off":
+            return None
+        if mode == "json_object":
+            return {"type": "json_object"}
+        return response_format
+
+    def _downgrade_structured(self, model: str) -> str:
+        current = self.structured_modes.get(model, STRUCTURED_OUTPUT)
+        modes = _STRUCTURED_MODES
+        mode = modes[min(modes.index(current) + 1, len(modes) - 1)] if current in modes else "off"
+        self.structured_modes[model] = mode
+        return mode
+
+    def _validated(self, out: Optional[str], schema: type, model: Optional[str], task: str,
+                   expect: Optional[type] = dict, list_field: Optional[str] = None):
+        """
+        Parse and validate a reply against ``schema``; a textual repair is tried before giving up.
+
+        The outcome (ok / repaired / failed) is recorded per model; cache hits
+        (``model`` None) were already counted when first parsed.
+        """
+        if not out:
+            return None
+
+        def validate(data, repair: bool = False):
+            if list_field and isinstance(data, list):
+                data = {list_field: data}
+            elif list_field and isinstance(data, dict) and list_field not in data:
+                # Some models pick their own wrapper key, e.g. {"items": [...]}
+                inner = next((v for v in data.values() if isinstance(v, list)), None)
+                data = {list_field: inner} if inner is not None else data
+            try:
+                # The repair pass also maps invented enum labels onto defaults
+                return schema.model_validate(data, context={"coerce_enums": repair}) if data is not None else None
+            except ValidationError:
+                return None
+
+        outcome = "ok"
+        result = validate(extract_json(out, expect))
+        if result is None:
+            result = validate(extract_json(repair_json(out), expect), repair=True)
+            outcome = "repaired" if result is not None else "failed"
+        if model:
+            llm_telemetry.record_parse(model, task, outcome)
+        if outcome == "failed":
+            logging.getLogger("openrouter").info(f"Unparseable {task} reply from '{model}': {out[:200]!r}")
+        return result
+
+    def close(self) -> None:
+        """Release pooled connections (called from the app lifespan on shutdown)."""
+        if self.http_client is not None:
+            self.http_client.close()
+
+    def pool_config(self) -> dict:
+        return {
+            "max_connections": OPENROUTER_MAX_CONNECTIONS,
+            "max_keepalive": OPENROUTER_MAX_KEEPALIVE,
+            "keepalive_expiry": OPENROUTER_KEEPALIVE_EXPIRY,
+            "http2": self.http2,
+        }
+
     def _select_model(self, requested: Optional[str]) -> Optional[str]:
         """Pick a model honoring only-free and allowlist settings."""
         candidate = requested or self.default_model
@@ -69,11 +238,85 @@ class OpenRouterService:
         # Try to find a close alternative from allowlist
         return self.free_allowlist[0] if self.free_allowlist else None
 
-    def _chat(self, messages: List[dict], model: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 800) -> Optional[str]:
-        logger = logging.getLogger("openrouter")
+    def _chat(self, messages: List[dict], model: Optional[str] = None, temperature: float = 0.2, max_tokens: int = 800,
+              task: Optional[str] = None, response_format: Optional[dict] = None, meta: Optional[dict] = None,
+              annotations: Optional[dict] = None, validate: Optional[Callable[[str, Optional[str]], Any]] = None) -> Optional[str]:
+        """
+        Run a chat completion through the cache, rate limit and fallback chain.
+
+        ``response_format`` is forwarded to models that accept it. When ``meta``
+        is given, ``meta["model"]`` is set to the model that produced the reply
+        (None for cache hits). ``annotations`` are copied into the telemetry record.
+
+        With ``validate(text, model)``, its result is put in ``meta["result"]``
+        and a reply is only cached when that result is not None, so an
+        unparseable reply is never replayed to other callers.
+        """
         if not self.client:
-            logger.debug("OpenRouter client not initialized; skipping AI call")
+            logging.getLogger("openrouter").debug("OpenRouter client not initialized; skipping AI call")
             return None
+        call = llm_telemetry.start(task, model)
+        if annotations:
+            call.update(annotations)
+        out = None
+        key = _cache_key(model, messages, temperature, max_tokens, response_format) if LLM_CACHE_TTL > 0 else None
+        lease_owner = None
+        try:
+            if key:
+                out, lease_owner = self._cached_or_lead(key)
+                if out:
+                    call["path"] = "cache"
+                    if validate is not None and meta is not None:
+                        meta["result"] = validate(out, None)
+                    return out
+            out = self._chat_attempts(messages, model, temperature, max_tokens, call, response_format)
+            result = validate(out, call["model"]) if validate is not None else out
+            if meta is not None:
+                meta["model"] = call["model"]
+                if validate is not None:
+                    meta["result"] = result
+            if out and key and result is not None:
+                try:
+                    shared_state.cache_set(key, out, LLM_CACHE_TTL)
+                except sqlite3.Error as e:
+                    logging.getLogger("openrouter").warning(f"LLM cache write failed: {e}")
+            return out
+        finally:
+            if lease_owner:
+                try:
+                    shared_state.release_lease(f"llm:{key}", lease_owner)
+                except sqlite3.Error:
+                    pass
+            llm_telemetry.finish(call, ok=bool(out))
+
+    def _cached_or_lead(self, key: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return ``(cached_text, None)`` on a cache hit, else ``(None, lease_owner)``.
+
+        Identical in-flight prompts from any worker wait for the first caller's
+        result instead of issuing a duplicate LLM call. A lease owner of None
+        means the lease could not be taken (waited too long or store error).
+        """
+        owner = f"{shared_state.owner}-{threading.get_ident()}"
+        deadline = time.monotonic() + LLM_SINGLEFLIGHT_WAIT
+        try:
+            while True:
+                cached = shared_state.cache_get(key)
+                if cached is not None:
+                    return cached, None
+                if shared_state.acquire_lease(f"llm:{key}", LLM_SINGLEFLIGHT_WAIT, owner):
+                    return None, owner
+                if time.monotonic() >= deadline:
+                    return None, None
+                time.sleep(0.05)
+        except sqlite3.Error as e:
+            logging.getLogger("openrouter").warning(f"LLM cache unavailable: {e}")
+            return None, None
+
+    def _chat_attempts(self, messages: List[dict], model: Optional[str], temperature: float, max_tokens: int, call: dict,
+                       response_format: Optional[dict] = None) -> Optional[str]:
+        """Run the primary -> fallback -> allowlist chain, recording into ``call``."""
+        logger = logging.getLogger("openrouter")
         def _messages_to_prompt(msgs: List[dict]) -> str:
             parts = []
             for m in msgs:
@@ -83,23 +326,57 @@ class OpenRouterService:
             return "\n\n".join(parts)
 
         def _call(mdl: str) -> Optional[str]:
+            call["models_tried"].append(mdl)
+            # Provider rate limit shared by all workers
+            t0 = time.perf_counter()
+            acquired = _rate_limiter.acquire(OPENROUTER_RATE_WAIT)
+            call["rate_wait_seconds"] += time.perf_counter() - t0
+            if not acquired:
+                raise RuntimeError("OpenRouter rate limit: no request slot within OPENROUTER_RATE_WAIT")
             # First try chat.completions
-            resp = self.client.chat.completions.create(
-                model=mdl,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
+            fmt = self._response_format_for(mdl, response_format)
+            while True:
+                extra = {"response_format": fmt} if fmt else {}
+                t0 = time.perf_counter()
+                try:
+                    with phase("llm"):
+                        resp = self.client.chat.completions.create(
+                            model=mdl,
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            **extra,
+                        )
+                    break
+                except Exception as e:
+                    if fmt and _rejects_response_format(e):
+                        # Model rejected the structured-output request: step down a mode and retry
+                        mode = self._downgrade_structured(mdl)
+                        logger.info(f"Model '{mdl}' rejected response_format; using '{mode}' from now on")
+                        fmt = self._response_format_for(mdl, response_format)
+                        continue
+                    call["errors"] += 1
+                    raise
+                finally:
+                    call["chat_seconds"] += time.perf_counter() - t0
+            llm_telemetry.add_usage(call, getattr(resp, "usage", None))
             try:
                 content = resp.choices[0].message.content
             except Exception:
                 content = None
             if content and isinstance(content, str) and content.strip():
+                call["model"], call["path"] = mdl, "chat"
                 return content
             # Fallback to responses.create aggregation
             try:
                 prompt = _messages_to_prompt(messages)
-                r2 = self.client.responses.create(model=mdl, input=prompt, max_output_tokens=max_tokens)
+                t0 = time.perf_counter()
+                try:
+                    with phase("llm"):
+                        r2 = self.client.responses.create(model=mdl, input=prompt, max_output_tokens=max_tokens)
+                finally:
+                    call["responses_seconds"] += time.perf_counter() - t0
+                llm_telemetry.add_usage(call, getattr(r2, "usage", None))
                 text = getattr(r2, "output_text", None)
                 if not text:
                     # best-effort extraction
@@ -112,9 +389,10 @@ class OpenRouterService:
                                     out.append(t.value)
                     text = "\n".join(out)
                 if text and text.strip():
+                    call["model"], call["path"] = mdl, "responses"
                     return text
             except Exception:
-                pass
+                call["errors"] += 1
             return None
         # Primary model
         try:
@@ -155,56 +433,99 @@ class OpenRouterService:
             logger.error(f"Fallback model call failed: {e}")
             return None
 
+    def cached_analysis(self, subject: str, body: str, sender: str) -> Optional[dict]:
+        """A previous ``analyze_email`` result for this email, without calling the LLM."""
+        if ANALYSIS_CACHE_TTL <= 0:
+            return None
+        try:
+            return shared_state.cache_get(_analysis_key(subject, body, sender))
+        except sqlite3.Error as e:
+            logging.getLogger("openrouter").warning(f"Analysis cache unavailable: {e}")
+            return None
+
+    def analyze_email(self, subject: str, body: str, sender: str) -> Optional[dict]:
+        """
+        Classification and suggested tasks in one structured call.
+
+        Returns ``{"classification": {...}, "tasks": [...]}``. Results are cached
+        per email (subject, sender, body) so the classify and suggest-task
+        endpoints share a single LLM call.
+        """
+        cached = self.cached_analysis(subject, body, sender)
+        if cached is not None:
+            return cached
+        key = _analysis_key(subject, body, sender)
+        body, body_stats = self._email_body(body, "email_analysis")
+        messages = [
+            {"role": "system", "content": "You are an expert email triage and productivity assistant. Return ONLY valid JSON."},
+            {"role": "user", "content": (
+                "Analyze the email and return one JSON object with keys: urgency (high|medium|low), "
+                "category (work|personal|promotional|newsletter|meeting|task), sentiment (positive|neutral|negative), "
+                "action (response_needed|fyi|action_item|meeting_invite), summary (<=25 words), and \"tasks\": "
+                "0-5 actionable tasks, each with title, description, priority (high|medium|low), "
+                "estimated_minutes (int), due_date (ISO8601 or null).\n\n"
+                f"Subject: {subject}\nFrom: {sender}\nBody: {body}"
+            )}
+        ]
+        meta: dict = {}
+        self._chat(messages, model=self.model_config["email_analysis"], temperature=0.1, max_tokens=900,
+                   task="email_analysis", response_format=ANALYSIS_FORMAT, meta=meta, annotations=body_stats,
+                   validate=lambda text, mdl: self._validated(text, EmailAnalysis, mdl, "email_analysis"))
+        result = meta.get("result")
+        if not result:
+            return None
+        analysis = {
+            "classification": result.model_dump(mode="json", exclude={"tasks"}),
+            "tasks": [t.model_dump(mode="json") for t in result.tasks],
+        }
+        if ANALYSIS_CACHE_TTL > 0:
+            try:
+                shared_state.cache_set(key, analysis, ANALYSIS_CACHE_TTL)
+            except sqlite3.Error as e:
+                logging.getLogger("openrouter").warning(f"Analysis cache write failed: {e}")
+        return analysis
+
     def classify_email(self, subject: str, body: str, sender: str) -> Optional[dict]:
+        if ANALYZE_COMBINED:
+            analysis = self.analyze_email(subject, body, sender)
+            return analysis["classification"] if analysis else None
+        body, body_stats = self._email_body(body, "email_classification")
         messages = [
             {"role": "system", "content": "You are an expert email triage assistant. Return ONLY valid JSON."},
             {"role": "user", "content": (
                 "Analyze the email and return JSON with keys: urgency (high|medium|low), "
                 "category (work|personal|promotional|newsletter|meeting|task), sentiment (positive|neutral|negative), "
                 "action (response_needed|fyi|action_item|meeting_invite), summary (<=25 words).\n\n"
-                f"Subject: {subject}\nFrom: {sender}\nBody: {body[:2000]}"
+                f"Subject: {subject}\nFrom: {sender}\nBody: {body}"
             )}
         ]
-        out = self._chat(messages, model=self.model_config["email_classification"], temperature=0.1, max_tokens=400)
-        if not out:
-            return None
-        try:
-            return json.loads(out)
-        except json.JSONDecodeError:
-            # Best-effort parsing for common wrappers
-            try:
-                start = out.find("{")
-                end = out.rfind("}") + 1
-                if start >= 0 and end > start:
-                    return json.loads(out[start:end])
-            except Exception:
-                pass
-            return None
+        meta: dict = {}
+        self._chat(messages, model=self.model_config["email_classification"], temperature=0.1, max_tokens=400,
+                   task="email_classification", response_format=CLASSIFICATION_FORMAT, meta=meta, annotations=body_stats,
+                   validate=lambda text, mdl: self._validated(text, EmailClassification, mdl, "email_classification"))
+        result = meta.get("result")
+        return result.model_dump(mode="json") if result else None
 
     def suggest_tasks(self, subject: str, body: str, sender: str) -> Optional[List[dict]]:
+        if ANALYZE_COMBINED:
+            analysis = self.analyze_email(subject, body, sender)
+            return analysis["tasks"] if analysis else None
+        body, body_stats = self._email_body(body, "task_generation")
         messages = [
-            {"role": "system", "content": "You are a productivity expert. Return ONLY a JSON array of tasks."},
+            {"role": "system", "content": "You are a productivity expert. Return ONLY a JSON object with a \"tasks\" array."},
             {"role": "user", "content": (
-                "From the email, generate 1-3 actionable tasks as a JSON array. Each task has: "
+                "From the email, generate 1-3 actionable tasks as {\"tasks\": [...]}. Each task has: "
                 "title, description, priority (high|medium|low), estimated_minutes (int), due_date (ISO8601 or null).\n\n"
-                f"Subject: {subject}\nFrom: {sender}\nBody: {body[:2000]}"
+                f"Subject: {subject}\nFrom: {sender}\nBody: {body}"
             )}
         ]
-        out = self._chat(messages, model=self.model_config["task_generation"], temperature=0.3, max_tokens=700)
-        if not out:
-            return None
-        try:
-            data = json.loads(out)
-            return data if isinstance(data, list) else None
-        except json.JSONDecodeError:
-            try:
-                start = out.find("[")
-                end = out.rfind("]") + 1
-                if start >= 0 and end > start:
-                    return json.loads(out[start:end])
-            except Exception:
-                pass
-            return None
+        meta: dict = {}
+        self._chat(messages, model=self.model_config["task_generation"], temperature=0.3, max_tokens=700,
+                   task="task_generation", response_format=TASKS_FORMAT, meta=meta, annotations=body_stats,
+                   # Bare arrays and other wrapper keys are accepted too
+                   validate=lambda text, mdl: self._validated(text, TaskList, mdl, "task_generation", expect=None, list_field="tasks"))
+        result = meta.get("result")
+        return [t.model_dump(mode="json") for t in result.tasks] if result else None
 
     def meeting_brief(self, title: str, when_iso: str, attendees: List[str], description: str = "", related_summaries: Optional[List[str]] = None) -> Optional[str]:
         context = f"Title: {title}\nTime: {when_iso}\nAttendees: {', '.join(attendees)}\nDescription: {description}\n"
@@ -217,4 +538,4 @@ class OpenRouterService:
                 "Questions to Ask, Expected Outcomes. Keep it under 250 words.\n\n" + context
             )}
         ]
-        return self._chat(messages, model=self.model_config["meeting_brief"], temperature=0.4, max_tokens=800)
+        return self._chat(messages, model=self.model_config["meeting_brief"], temperature=0.4, max_tokens=800, task="meeting_brief")
@@ -0,0 +1,327 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not serialised across workers
+    fcntl = None
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_ADDRESS_RE = re.compile(r"[\w.+-]+@([\w-]+\.)+[\w-]+")
+
+# Fields the LLM returns that the local model learns to predict
+HEADS: Dict[str, Tuple[str, ...]] = {
+    "category": ("work", "personal", "promotional", "newsletter", "meeting", "task"),
+    "urgency": ("high", "medium", "low"),
+    "action": ("response_needed", "fyi", "action_item", "meeting_invite"),
+    "sentiment": ("positive", "neutral", "negative"),
+}
+
+PRECLASSIFY_ENABLED = os.getenv("PRECLASSIFY_ENABLED", "true").lower() in ("1", "true", "yes")
+PRECLASSIFY_THRESHOLD = float(os.getenv("PRECLASSIFY_THRESHOLD", "0.9"))
+PRECLASSIFY_MIN_EXAMPLES = int(os.getenv("PRECLASSIFY_MIN_EXAMPLES", "200"))
+PRECLASSIFY_AUDIT_RATE = float(os.getenv("PRECLASSIFY_AUDIT_RATE", "0.05"))
+PRECLASSIFY_STATE = os.getenv("PRECLASSIFY_STATE")  # optional JSON file to persist weights (shared by workers)
+
+
+def extract_features(subject: str, body: str, sender: str, dims: int, max_body: int = 2000) -> Dict[int, float]:
+    """Hashed, L2-normalised unigram/bigram features over subject, sender and body."""
+    counts: Dict[int, float] = {}
+
+    def add(feature: str, weight: float = 1.0) -> None:
+        # crc32 is stable across processes and far cheaper than a cryptographic hash
+        index = zlib.crc32(feature.encode("utf-8")) % dims
+        counts[index] = counts.get(index, 0.0) + weight
+
+    def ngrams(prefix: str, text: str, weight: float) -> None:
+        words = _WORD_RE.findall(text.lower())
+        for i, w in enumerate(words):
+            add(f"{prefix}:{w}", weight)
+            if i:
+                add(f"{prefix}:{words[i - 1]} {w}", weight)
+
+    ngrams("s", subject or "", 2.0)
+    ngrams("b", (body or "")[:max_body], 1.0)
+    sender = (sender or "").lower()
+    match = _ADDRESS_RE.search(sender)
+    if match:
+        address = match.group(0)
+        add(f"f:{address}", 3.0)
+        add(f"d:{address.split('@', 1)[1]}", 2.0)
+        add(f"u:{address.split('@', 1)[0]}")  # noreply, newsletter, billing, ...
+    elif sender:
+        add(f"f:{sender}", 3.0)
+    add("bias")
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+class _Head:
+    """Sparse multinomial logistic regression trained by online SGD."""
+
+    __slots__ = ("labels", "weights")
+
+    def __init__(self, labels: Tuple[str, ...]):
+        self.labels = labels
+        self.weights: List[Dict[int, float]] = [{} for _ in labels]
+
+    def predict(self, features: Dict[int, float]) -> Tuple[str, float]:
+        scores = [sum(w.get(k, 0.0) * v for k, v in features.items()) for w in self.weights]
+        top = max(scores)
+        exp = [math.exp(s - top) for s in scores]
+        total = sum(exp)
+        best = max(range(len(exp)), key=exp.__getitem__)
+        return self.labels[best], exp[best] / total
+
+    def update(self, features: Dict[int, float], label: str, lr: float) -> None:
+        if label not in self.labels:
+            return
+        scores = [sum(w.get(k, 0.0) * v for k, v in features.items()) for w in self.weights]
+        top = max(scores)
+        exp = [math.exp(s - top) for s in scores]
+        total = sum(exp)
+        target = self.labels.index(label)
+        for i, w in enumerate(self.weights):
+            grad = exp[i] / total - (1.0 if i == target else 0.0)
+            if abs(grad) < 1e-4:
+                continue
+            for k, v in features.items():
+                w[k] = w.get(k, 0.0) - lr * grad * v
+
+
+class PreClassifier:
+    """
+    Local hashed-feature linear model that answers confident cases before the LLM.
+
+    Every LLM classification is fed back through ``learn`` so the model trains
+    online. Before the update, the model's own prediction is scored against the
+    LLM labels; that shadow accuracy is what ``stats`` reports. A small audit
+    sample of confident predictions is still sent to the LLM so accuracy on
+    offloaded traffic keeps being measured.
+    """
+
+    def __init__(self, dims: int = 1 << 18, threshold: float = PRECLASSIFY_THRESHOLD,
+                 min_examples: int = PRECLASSIFY_MIN_EXAMPLES, audit_rate: float = PRECLASSIFY_AUDIT_RATE,
+                 learning_rate: float = 0.5, state_path: Optional[str] = PRECLASSIFY_STATE):
+        self.dims = dims
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.audit_rate = audit_rate
+        self.learning_rate = learning_rate
+        self.state_path = state_path
+        self._heads = {name: _Head(labels) for name, labels in HEADS.items()}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._logger = logging.getLogger("preclassifier")
+        self.examples = 0
+        self.local = 0
+        self.llm = 0
+        self.audited = 0
+        self._correct = {name: 0 for name in HEADS}
+        self._confident_seen = 0
+        self._confident_correct = 0
+        # Model as of the last load/save; save() merges only what changed since
+        with self._lock:
+            self._synced = self._state()
+        if state_path and os.path.exists(state_path):
+            self.load(state_path)
+
+    def features(self, subject: str, body: str, sender: str) -> Dict[int, float]:
+        return extract_features(subject, body, sender, self.dims)
+
+    def _predict(self, features: Dict[int, float]) -> Tuple[Dict[str, str], float]:
+        labels: Dict[str, str] = {}
+        confidence = 1.0
+        for name, head in self._heads.items():
+            labels[name], p = head.predict(features)
+            confidence = min(confidence, p)
+        return labels, confidence
+
+    def classify(self, features: Dict[int, float], subject: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Return a local classification when every head is confident, else None.
+
+        None means "ask the LLM"; the caller should then pass the LLM result to
+        ``learn`` with the same features.
+        """
+        with self._lock:
+            if self.examples < self.min_examples:
+                self.llm += 1
+                return None
+            labels, confidence = self._predict(features)
+            if confidence < self.threshold or self._rng.random() < self.audit_rate:
+                if confidence >= self.threshold:
+                    self.audited += 1
+                self.llm += 1
+                return None
+            self.local += 1
+        return {
+            **labels,
+            "summary": (subject or "")[:160],
+            "confidence": round(confidence, 3),
+            "source": "local",
+        }
+
+    def learn(self, features: Dict[int, float], result: Dict[str, Any]) -> None:
+        """Score the current model against an LLM label, then train on it."""
+        targets = {name: str(result.get(name, "")).lower() for name in HEADS}
+        with self._lock:
+            labels, confidence = self._predict(features)
+            for name in HEADS:
+                if labels[name] == targets[name]:
+                    self._correct[name] += 1
+            if confidence >= self.threshold:
+                self._confident_seen += 1
+                if labels == targets:
+                    self._confident_correct += 1
+            for name, head in self._heads.items():
+                head.update(features, targets[name], self.learning_rate)
+            self.examples += 1
+            save = self.state_path and self.examples % 100 == 0
+        if save:
+            try:
+                self.save(self.state_path)
+            except OSError as e:
+                self._logger.warning(f"Could not persist pre-classifier state: {e}")
+
+    def classify_or_ask(self, ai, subject: str, body: str, sender: str) -> Optional[Dict[str, Any]]:
+        """Local classification when confident, otherwise ``ai.classify_email`` (and learn from it)."""
+        if not PRECLASSIFY_ENABLED:
+            return ai.classify_email(subject, body, sender)
+        features = self.features(subject, body, sender)
+        result = self.classify(features, subject)
+        if result is None:
+            result = ai.classify_email(subject, body, sender)
+            if result:
+                self.learn(features, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            examples, local, llm, audited = self.examples, self.local, self.llm, self.audited
+            correct = dict(self._correct)
+            confident_seen, confident_correct = self._confident_seen, self._confident_correct
+        decided = local + llm
+        return {
+            "enabled": PRECLASSIFY_ENABLED,
+            "examples": examples,
+            "threshold": self.threshold,
+            "local": local,
+            "llm": llm,
+            "audited": audited,
+            "offload_rate": (local / decided) if decided else 0.0,
+            # Shadow accuracy of the model against LLM labels, per field
+            "accuracy": {name: (c / examples) if examples else 0.0 for name, c in correct.items()},
+            # Exact-match accuracy of predictions that would have been served locally
+            "confident_accuracy": (confident_correct / confident_seen) if confident_seen else None,
+        }
+
+    def _state(self) -> Dict[str, Any]:
+        """Weights and persisted counters (call with the lock held)."""
+        return {
+            "examples": self.examples,
+            # Shadow-accuracy counters, so stats() stays right after a reload
+            "correct": dict(self._correct),
+            "confident_seen": self._confident_seen,
+            "confident_correct": self._confident_correct,
+            "heads": {name: [dict(w) for w in head.weights] for name, head in self._heads.items()},
+        }
+
+    def _adopt(self, state: Dict[str, Any]) -> None:
+        """Replace the model with ``state`` and remember it as the last synced copy (lock held)."""
+        for name, weights in state["heads"].items():
+            self._heads[name].weights = [dict(w) for w in weights]
+        self.examples = state["examples"]
+        self._correct = dict(state["correct"])
+        self._confident_seen = state["confident_seen"]
+        self._confident_correct = state["confident_correct"]
+        self._synced = state
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        """Parsed state file, or None when missing, unreadable or for other dims."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except (OSError, ValueError) as e:
+            self._logger.warning(f"Ignoring unreadable pre-classifier state {path}: {e}")
+            return None
+        if raw.get("dims") != self.dims:
+            return None
+        heads = {}
+        for name, head in self._heads.items():
+            weights = raw.get("heads", {}).get(name)
+            if weights and len(weights) == len(head.labels):
+                heads[name] = [{int(k): v for k, v in w.items()} for w in weights]
+            else:
+                heads[name] = [{} for _ in head.labels]
+        correct = raw.get("correct", {})
+        return {
+            "examples": int(raw.get("examples", 0)),
+            "correct": {name: int(correct.get(name, 0)) for name in HEADS},
+            "confident_seen": int(raw.get("confident_seen", 0)),
+            "confident_correct": int(raw.get("confident_correct", 0)),
+            "heads": heads,
+        }
+
+    def save(self, path: str) -> None:
+        """
+        Merge this worker's training since its last save into the shared state file.
+
+        Each worker adds the change it made since it last synced (weights and
+        counters) on top of what is on disk, then continues from the merged
+        model, so workers learn from each other instead of overwriting it.
+        """
+        with open(f"{path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            with self._lock:
+                mine = self._state()
+                disk = self._read(path) or self._synced
+                merged = _merge(disk, self._synced, mine)
+                self._adopt(merged)
+            state = {"dims": self.dims, **{k: v for k, v in merged.items() if k != "heads"}}
+            state["heads"] = {name: [{str(k): v for k, v in w.items()} for w in weights] for name, weights in merged["heads"].items()}
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+
+    def load(self, path: str) -> None:
+        state = self._read(path)
+        if state is not None:
+            with self._lock:
+                self._adopt(state)
+
+
+def _merge(disk: Dict[str, Any], base: Dict[str, Any], mine: Dict[str, Any]) -> Dict[str, Any]:
+    """``disk + (mine - base)`` for weights and counters."""
+    heads = {}
+    for name, weights in mine["heads"].items():
+        merged = []
+        for theirs, old, new in zip(disk["heads"][name], base["heads"][name], weights):
+            out = dict(theirs)
+            for k, v in new.items():
+                delta = v - old.get(k, 0.0)
+                if delta:
+                    out[k] = out.get(k, 0.0) + delta
+            merged.append(out)
+        heads[name] = merged
+    return {
+        "examples": disk["examples"] + mine["examples"] - base["examples"],
+        "correct": {name: disk["correct"][name] + mine["correct"][name] - base["correct"][name] for name in HEADS},
+        "confident_seen": disk["confident_seen"] + mine["confident_seen"] - base["confident_seen"],
+        "confident_correct": disk["confident_correct"] + mine["confident_correct"] - base["confident_correct"],
+        "heads": heads,
+    }
+
+
+preclassifier = PreClassifier()
@@ -0,0 +1,134 @@
+import math
+import re
+from typing import Dict, Tuple
+
+# Start of quoted history: everything from here on is dropped
+_HISTORY_MARKERS = [
+    re.compile(r"^\s*On\b.{0,200}\bwrote:\s*$", re.IGNORECASE | re.DOTALL),   # Gmail / Apple Mail
+    re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}", re.IGNORECASE),      # Outlook
+    re.compile(r"^\s*_{10,}\s*$"),
+    re.compile(r"^\s*Le .{0,200} a écrit\s*:\s*$", re.IGNORECASE | re.DOTALL),
+    re.compile(r"^\s*Am .{0,200} schrieb .{0,100}:\s*$", re.IGNORECASE | re.DOTALL),
+]
+
+# Forwarded mail is the content being triaged: only its marker and header block are dropped
+_FORWARD_RE = re.compile(r"^\s*-{2,}\s*(Forwarded message|Begin forwarded message)\s*-*:?\s*$", re.IGNORECASE)
+_FORWARD_HEADER_RE = re.compile(r"^\s*\*?(From|Sent|Date|To|Cc|Subject|Reply-To):", re.IGNORECASE)
+
+# Outlook-style quoted header: "From:" followed shortly by "Sent:"/"Date:"/"To:"
+_FROM_RE = re.compile(r"^\s*\*?From:\*?\s.+$", re.IGNORECASE)
+_HEADER_FOLLOW_RE = re.compile(r"^\s*\*?(Sent|Date|To|Subject):", re.IGNORECASE)
+
+# Start of a signature block
+_SIGNATURE_MARKERS = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^\s*Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^\s*Get Outlook for \w+", re.IGNORECASE),
+]
+
+# Boilerplate footer phrases; a paragraph is only dropped when it is short and
+# these (plus links) make up a good share of it, so "review the privacy policy
+# draft by Friday" survives while "Unsubscribe | Privacy policy" does not
+_FOOTER_RE = re.compile(
+    r"(confidential|privileged).{0,200}(intended recipient|disclos|notify the sender)"
+    r"|unsubscribe|manage (your )?(email )?preferences|view (this email )?in (your )?browser"
+    r"|privacy policy|you are receiving this (email|message)|no longer wish to receive"
+    r"|this (e-?mail|message) (and any attachments )?(is|may be) (confidential|intended)"
+    r"|all rights reserved|click here",
+    re.IGNORECASE | re.DOTALL,
+)
+FOOTER_MAX_CHARS = 600
+FOOTER_MIN_SHARE = 0.35
+
+_URL_RE = re.compile(r"(https?://)([^/\s<>\"')\]]+)[^\s<>\"')\]]*")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_SPACE_RUN_RE = re.compile(r"[ \t ]{2,}")
+
+# Rough tokens for English prose with BPE tokenizers; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _is_footer(paragraph: str) -> bool:
+    text = paragraph.strip()
+    if len(text) > FOOTER_MAX_CHARS:
+        return False
+    matched = sum(len(m.group(0).replace(" ", "")) for m in _FOOTER_RE.finditer(text))
+    if not matched:
+        return False
+    matched += sum(len(m.group(0)) for m in _URL_RE.finditer(text))
+    return matched >= FOOTER_MIN_SHARE * len(text.replace(" ", ""))
+
+
+def _shorten_url(match: "re.Match", max_len: int) -> str:
+    url = match.group(0)
+    return url if len(url) <= max_len else f"{match.group(1)}{match.group(2)}/…"
+
+
+def compact_body(body: str, max_url_len: int = 40) -> str:
+    """
+    Strip what doesn't help triage: quoted reply history, ``>`` lines,
+    signatures, legal/marketing footers and long (tracking) URLs.
+    """
+    if not body:
+        return ""
+    lines = body.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    kept = []
+    in_forward_header = False
+    for i, line in enumerate(lines):
+        if _FORWARD_RE.match(line):
+            in_forward_header = True
+            continue
+        if in_forward_header:
+            if _FORWARD_HEADER_RE.match(line):
+                continue
+            in_forward_header = False
+        # "On <date>, <name> wrote:" is often wrapped over two lines
+        joined = line if i + 1 >= len(lines) else f"{line} {lines[i + 1]}"
+        if kept and any(m.match(line) or m.match(joined) for m in _HISTORY_MARKERS):
+            break
+        if kept and _FROM_RE.match(line) and any(_HEADER_FOLLOW_RE.match(l) for l in lines[i + 1:i + 4]):
+            break
+        if any(m.match(line) for m in _SIGNATURE_MARKERS):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    paragraphs = [p for p in "\n".join(kept).split("\n\n") if p.strip() and not _is_footer(p)]
+    text = "\n\n".join(paragraphs)
+    text = _URL_RE.sub(lambda m: _shorten_url(m, max_url_len), text)
+    text = _SPACE_RUN_RE.sub(" ", text)
+    return _BLANK_RUN_RE.sub("\n\n", text).strip()
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut ``text`` to about ``budget`` tokens, preferring a paragraph or sentence boundary."""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for sep in ("\n\n", "\n", ". "):
+        pos = cut.rfind(sep)
+        if pos >= limit * 0.6:
+            return cut[:pos + (1 if sep == ". " else 0)].rstrip() + " …"
+    return cut.rstrip() + " …"
+
+
+def prepare_body(body: str, budget: int) -> Tuple[str, Dict[str, int]]:
+    """Compact then budget an email body; returns the text and token accounting."""
+    original = estimate_tokens(body or "")
+    compacted = compact_body(body or "")
+    # Never send an empty body when stripping removed everything
+    if not compacted and body:
+        compacted = body.strip()
+    sent = truncate_to_tokens(compacted, budget)
+    sent_tokens = estimate_tokens(sent)
+    return sent, {
+        "body_tokens_original": original,
+        "body_tokens_compacted": estimate_tokens(compacted),
+        "body_tokens_sent": sent_tokens,
+        "body_tokens_saved": max(0, original - sent_tokens),
+    }
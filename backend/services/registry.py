@@ -0,0 +1,123 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+class ServiceRegistry:
+    """
+    Lazily constructed, process-wide service singletons.
+
+    Factories are registered up front but only run on the first ``get``, so
+    importing a router never pays for an SDK import or client construction.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._init_seconds: Dict[str, float] = {}
+        # Reentrant: a factory may get() the services it depends on (gmail_sync -> token_store)
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                t0 = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._init_seconds[name] = time.perf_counter() - t0
+            return self._instances[name]
+
+    def set(self, name: str, instance: Any) -> None:
+        """Install an instance directly (e.g. a stub in a benchmark)."""
+        with self._lock:
+            self._instances[name] = instance
+
+    def close(self) -> None:
+        """Close every created instance that has a ``close`` method, in reverse creation order."""
+        with self._lock:
+            instances = list(self._instances.values())
+            self._instances.clear()
+        for instance in reversed(instances):
+            close = getattr(instance, "close", None)
+            if callable(close):
+                close()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            name: {"initialized": name in self._instances, "init_seconds": self._init_seconds.get(name)}
+            for name in self._factories
+        }
+
+
+def _openrouter():
+    from services.openrouter_service import OpenRouterService
+    return OpenRouterService()
+
+
+def _token_store():
+    from services.token_store import TokenStore
+    try:
+        from database import SessionLocal
+        from models import EmailAccount
+    except ImportError:
+        SessionLocal = EmailAccount = None
+    return TokenStore(SessionLocal, EmailAccount)
+
+
+def _gmail_sync():
+    from services.gmail_sync import GmailSyncEngine
+    try:
+        from database import SessionLocal
+        from models import EmailAccount, StoredEmail
+    except ImportError:
+        SessionLocal = EmailAccount = StoredEmail = None
+    return GmailSyncEngine(SessionLocal, EmailAccount, StoredEmail, registry.get("token_store"))
+
+
+def _sync_scheduler():
+    from services.sync_scheduler import SyncScheduler, account_loader
+    try:
+        from database import SessionLocal
+        from models import EmailAccount, User
+    except ImportError:
+        return SyncScheduler({})
+
+    def sync_gmail(account_id):
+        result = registry.get("gmail_sync").sync_account(account_id)
+        return None if result.get("skipped") else result["stored"]
+
+    runners = {"gmail": sync_gmail}
+    return SyncScheduler(runners, account_loader(SessionLocal, EmailAccount, User))
+
+
+registry = ServiceRegistry()
+registry.register("openrouter", _openrouter)
+registry.register("token_store", _token_store)
+registry.register("gmail_sync", _gmail_sync)
+registry.register("sync_scheduler", _sync_scheduler)
+
+
+def get_openrouter():
+    """Shared OpenRouterService, created on first use; also usable as a FastAPI dependency."""
+    return registry.get("openrouter")
+
+
+def get_token_store():
+    """Shared TokenStore (encrypted OAuth credentials, cache and refresher), created on first use."""
+    return registry.get("token_store")
+
+
+def get_gmail_sync():
+    """Shared GmailSyncEngine (and its HTTP pool), created on first use."""
+    return registry.get("gmail_sync")
+
+
+def get_sync_scheduler():
+    """Shared SyncScheduler for linked-account mailbox syncs, created on first use."""
+    return registry.get("sync_scheduler")
@@ -0,0 +1,350 @@
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from shared_state import shared_state
+
+SYNC_MAX_CONCURRENCY = max(1, int(os.getenv("SYNC_MAX_CONCURRENCY", "8")))
+SYNC_HOST_CONCURRENCY = max(1, int(os.getenv("SYNC_HOST_CONCURRENCY", "4")))  # per provider host
+SYNC_JITTER = min(0.5, max(0.0, float(os.getenv("SYNC_JITTER", "0.1"))))  # +/- fraction of the interval
+SYNC_BACKOFF_FACTOR = float(os.getenv("SYNC_BACKOFF_FACTOR", "1.5"))  # per sync that finds no new mail
+SYNC_MAX_BACKOFF = float(os.getenv("SYNC_MAX_BACKOFF", "8"))  # cap, as a multiple of the interval
+SYNC_MIN_INTERVAL = float(os.getenv("SYNC_MIN_INTERVAL", "60"))  # seconds
+SYNC_RELOAD_SECONDS = float(os.getenv("SYNC_RELOAD_SECONDS", "300"))
+# Operator-set fair-share weights, "user_id=weight,..." (others get 1.0): a weight-2 user gets twice the dispatches
+SYNC_TENANT_WEIGHTS = os.getenv("SYNC_TENANT_WEIGHTS", "")
+DEFAULT_CHECK_MINUTES = 15
+
+# Provider -> host whose connection limits the per-host cap protects
+PROVIDER_HOSTS = {"gmail": "gmail.googleapis.com"}
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        tenant, _, weight = item.partition("=")
+        try:
+            if tenant.strip() and float(weight) > 0:
+                weights[tenant.strip()] = float(weight)
+        except ValueError:
+            logging.getLogger("sync_scheduler").warning(f"Ignoring bad SYNC_TENANT_WEIGHTS entry {item!r}")
+    return weights
+
+
+class _Account:
+    __slots__ = ("account_id", "tenant", "provider", "host", "interval", "backoff", "failures",
+                 "next_due", "version", "queued", "running")
+
+    def __init__(self, account_id: str, tenant: str, provider: str, host: str, interval: float):
+        self.account_id = account_id
+        self.tenant = tenant
+        self.provider = provider
+        self.host = host
+        self.interval = interval
+        self.backoff = 1.0
+        self.failures = 0
+        self.next_due = 0.0
+        self.version = 0  # bumps invalidate stale heap entries
+        self.queued = False
+        self.running = False
+
+
+class _Tenant:
+    __slots__ = ("weight", "vtime", "ready")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.vtime = 0.0
+        self.ready: Deque[str] = deque()
+
+
+class SyncScheduler:
+    """
+    Central scheduler for per-account mailbox syncs.
+
+    Accounts sit in a min-heap keyed by next-due time. Each interval comes
+    from the user's ``email_check_frequency`` and gets jitter, and first runs
+    are spread over a whole interval, so accounts added together never fire
+    together. Due accounts wait in per-tenant (per-user) queues.
+
+    Dispatch is start-time fair queuing: the tenant with the lowest virtual
+    time goes next, and each dispatch advances its virtual time by
+    1 / weight. A user with many accounts therefore can't crowd out others.
+    Dispatch is bounded by SYNC_MAX_CONCURRENCY overall and
+    SYNC_HOST_CONCURRENCY per provider host.
+
+    Mailboxes that keep coming back empty are polled less often, up to
+    SYNC_MAX_BACKOFF times their interval, and drop back to the base
+    interval as soon as new mail arrives. Failures back off exponentially.
+    The result is a steady, bounded stream of IMAP/Gmail and LLM work
+    rather than synchronized bursts. With several workers only the holder of
+    the ``sync-scheduler`` lease dispatches.
+    """
+
+    def __init__(self, runners: Dict[str, Callable[[str], int]],
+                 loader: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+                 max_concurrency: int = SYNC_MAX_CONCURRENCY, host_concurrency: int = SYNC_HOST_CONCURRENCY,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        # provider -> fn(account_id) returning the number of new messages, or None if the sync was skipped
+        self.runners = runners
+        self.loader = loader
+        self.max_concurrency = max_concurrency
+        self.host_concurrency = host_concurrency
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._accounts: Dict[str, _Account] = {}
+        self._tenants: Dict[str, _Tenant] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._host_running: Dict[str, int] = {}
+        self._running = 0
+        self._vclock = 0.0
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._counts = {"dispatched": 0, "new_mail": 0, "empty": 0, "skipped": 0, "errors": 0}
+        self._lag_total = 0.0
+        self._logger = logging.getLogger("sync_scheduler")
+
+    # Membership ----------------------------------------------------------
+
+    def add(self, account_id: str, tenant: str, provider: str, interval: float, weight: float = 1.0,
+            host: Optional[str] = None) -> None:
+        """Register or update an account; new accounts get a random first run within one interval."""
+        interval = max(SYNC_MIN_INTERVAL, interval)
+        with self._cond:
+            tenant_state = self._tenants.get(tenant)
+            if tenant_state is None:
+                tenant_state = self._tenants[tenant] = _Tenant(weight)
+            tenant_state.weight = max(weight, 1e-6)
+            acct = self._accounts.get(account_id)
+            if acct is not None:
+                if acct.interval != interval:
+                    acct.interval = interval
+                    if not acct.queued and not acct.running:
+                        self._push(acct, self._clock() + self._delay(acct))
+                return
+            acct = self._accounts[account_id] = _Account(account_id, tenant, provider,
+                                                         host or PROVIDER_HOSTS.get(provider, provider), interval)
+            self._push(acct, self._clock() + self._rng.uniform(0, interval))
+            self._cond.notify()
+
+    def remove(self, account_id: str) -> None:
+        with self._cond:
+            acct = self._accounts.pop(account_id, None)
+            if acct is None:
+                return
+            acct.version += 1
+            tenant = self._tenants.get(acct.tenant)
+            if tenant is not None:
+                if account_id in tenant.ready:
+                    tenant.ready.remove(account_id)
+                if not tenant.ready and not any(a.tenant == acct.tenant for a in self._accounts.values()):
+                    del self._tenants[acct.tenant]
+
+    def reload(self) -> int:
+        """Sync membership with ``loader``; returns the number of scheduled accounts."""
+        if self.loader is None:
+            return len(self._accounts)
+        rows = [r for r in self.loader() if r["provider"] in self.runners]
+        for row in rows:
+            self.add(row["account_id"], row["tenant"], row["provider"], row["interval"], row.get("weight", 1.0), row.get("host"))
+        live = {row["account_id"] for row in rows}
+        for account_id in [a for a in list(self._accounts) if a not in live]:
+            self.remove(account_id)
+        return len(self._accounts)
+
+    # Scheduling ----------------------------------------------------------
+
+    def _delay(self, acct: _Account) -> float:
+        factor = self._rng.uniform(1 - SYNC_JITTER, 1 + SYNC_JITTER)
+        if acct.failures:
+            return acct.interval * min(2 ** (acct.failures - 1), SYNC_MAX_BACKOFF) * factor
+        return acct.interval * acct.backoff * factor
+
+    def _push(self, acct: _Account, due: float) -> None:
+        acct.version += 1
+        acct.next_due = due
+        heapq.heappush(self._heap, (due, acct.version, acct.account_id))
+
+    def _collect_due(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, version, account_id = heapq.heappop(self._heap)
+            acct = self._accounts.get(account_id)
+            if acct is None or acct.version != version or acct.queued or acct.running:
+                continue  # removed or rescheduled since this entry was pushed
+            tenant = self._tenants[acct.tenant]
+            if not tenant.ready:
+                # A tenant returning from idle starts at the current virtual time, not with saved-up credit
+                tenant.vtime = max(tenant.vtime, self._vclock)
+            tenant.ready.append(account_id)
+            acct.queued = True
+
+    def _pick(self) -> Optional[_Account]:
+        """Next account by tenant virtual time, skipping hosts at their cap."""
+        candidates = sorted((t.vtime, name) for name, t in self._tenants.items() if t.ready)
+        for _, name in candidates:
+            tenant = self._tenants[name]
+            for account_id in tenant.ready:
+                acct = self._accounts[account_id]
+                if self._host_running.get(acct.host, 0) < self.host_concurrency:
+                    tenant.ready.remove(account_id)
+                    self._vclock = tenant.vtime
+                    tenant.vtime += 1.0 / tenant.weight
+                    return acct
+        return None
+
+    def dispatch_ready(self) -> int:
+        """Start as many due syncs as the caps allow; returns how many were started."""
+        started = 0
+        with self._cond:
+            now = self._clock()
+            self._collect_due(now)
+            while self._running < self.max_concurrency:
+                acct = self._pick()
+                if acct is None:
+                    break
+                acct.queued = False
+                acct.running = True
+                self._running += 1
+                self._host_running[acct.host] = self._host_running.get(acct.host, 0) + 1
+                self._counts["dispatched"] += 1
+                self._lag_total += max(0.0, now - acct.next_due)
+                self._submit(acct)
+                started += 1
+        return started
+
+    def _submit(self, acct: _Account) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="sync")
+        self._executor.submit(self._run_one, acct)
+
+    def _run_one(self, acct: _Account) -> None:
+        new_mail, error = 0, None
+        try:
+            new_mail = self.runners[acct.provider](acct.account_id)
+        except Exception as e:
+            error = e
+            self._logger.warning(f"Sync failed for account {acct.account_id}: {e}")
+        with self._cond:
+            acct.running = False
+            self._running -= 1
+            self._host_running[acct.host] -= 1
+            if error is None and new_mail is None:
+                # Another sync of this account was in progress; says nothing about the mailbox
+                self._counts["skipped"] += 1
+            elif error is not None:
+                acct.failures += 1
+                self._counts["errors"] += 1
+            else:
+                acct.failures = 0
+                if new_mail:
+                    acct.backoff = 1.0
+                    self._counts["new_mail"] += 1
+                else:
+                    acct.backoff = min(acct.backoff * SYNC_BACKOFF_FACTOR, SYNC_MAX_BACKOFF)
+                    self._counts["empty"] += 1
+            if acct.account_id in self._accounts:
+                self._push(acct, self._clock() + self._delay(acct))
+            self._cond.notify()
+
+    # Background loop -----------------------------------------------------
+
+    def _run(self) -> None:
+        lease_ttl = max(30.0, SYNC_RELOAD_SECONDS)
+        last_reload = float("-inf")
+        leader = False
+        last_lease = float("-inf")
+        while not self._stop.is_set():
+            now = time.monotonic()
+            try:
+                if now - last_lease >= lease_ttl / 3:
+                    leader = shared_state.acquire_lease("sync-scheduler", lease_ttl)
+                    last_lease = now
+                if leader and now - last_reload >= SYNC_RELOAD_SECONDS:
+                    last_reload = now  # a failing reload is retried next interval, not every loop
+                    self.reload()
+                if leader:
+                    self.dispatch_ready()
+            except Exception as e:
+                self._logger.warning(f"Sync scheduling failed: {e}")
+            with self._cond:
+                # Sleep until the next due time, a finished sync frees capacity or 5s pass
+                timeout = 5.0
+                if leader and self._heap:
+                    timeout = min(timeout, max(0.05, self._heap[0][0] - self._clock()))
+                self._cond.wait(timeout)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sync-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            try:
+                shared_state.release_lease("sync-scheduler")
+            except Exception:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def close(self) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            backoffs = [a.backoff for a in self._accounts.values()]
+            now = self._clock()
+            return {
+                **self._counts,
+                "accounts": len(self._accounts),
+                "tenants": len(self._tenants),
+                "in_flight": self._running,
+                "in_flight_by_host": {h: n for h, n in self._host_running.items() if n},
+                "ready": sum(len(t.ready) for t in self._tenants.values()),
+                "next_due_seconds": max(0.0, self._heap[0][0] - now) if self._heap else None,
+                "avg_dispatch_lag_seconds": self._lag_total / self._counts["dispatched"] if self._counts["dispatched"] else 0.0,
+                "backed_off": sum(1 for b in backoffs if b > 1.0),
+                "scheduler_running": self._thread is not None,
+            }
+
+
+def account_loader(session_factory, account_model, user_model) -> Callable[[], List[Dict[str, Any]]]:
+    """
+    Loader yielding active linked accounts with their owner's ``email_check_frequency``
+    and fair-share weight from SYNC_TENANT_WEIGHTS.
+    """
+    weights = _parse_weights(SYNC_TENANT_WEIGHTS)
+
+    def load() -> List[Dict[str, Any]]:
+        session = session_factory()
+        try:
+            rows = session.query(account_model.id, account_model.user_id, account_model.provider, user_model.preferences) \
+                .outerjoin(user_model, user_model.id == account_model.user_id) \
+                .filter(account_model.is_active.is_(True)).all()
+        finally:
+            session.close()
+        return [{
+            "account_id": account_id,
+            "tenant": user_id,
+            "provider": provider,
+            "interval": float((prefs or {}).get("email_check_frequency") or DEFAULT_CHECK_MINUTES) * 60,
+            "weight": weights.get(user_id, 1.0),
+        } for account_id, user_id, provider, prefs in rows]
+
+    return load
@@ -0,0 +1,349 @@
+import base64
+import hashlib
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from services.google_oauth_service import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_TOKEN_URI
+from shared_state import shared_state
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    InvalidToken = ValueError
+
+# Fernet key (urlsafe base64, 32 bytes); derived from SECRET_KEY when unset
+TOKEN_ENCRYPTION_KEY = os.getenv("TOKEN_ENCRYPTION_KEY")
+OAUTH_REFRESH_AHEAD = float(os.getenv("OAUTH_REFRESH_AHEAD", "600"))  # renew this many seconds before expiry
+OAUTH_REFRESH_INTERVAL = float(os.getenv("OAUTH_REFRESH_INTERVAL", "60"))
+OAUTH_REFRESH_BATCH = int(os.getenv("OAUTH_REFRESH_BATCH", "50"))  # accounts per scan
+OAUTH_REFRESH_CONCURRENCY = max(1, int(os.getenv("OAUTH_REFRESH_CONCURRENCY", "4")))
+OAUTH_TIMEOUT = float(os.getenv("OAUTH_TIMEOUT", "15"))
+# A token this close to expiry is refreshed inline rather than handed out
+_MIN_VALIDITY = timedelta(seconds=60)
+_PREFIX = "fernet:"
+
+
+class TokenRefreshError(Exception):
+    def __init__(self, message: str, revoked: bool = False):
+        super().__init__(message)
+        self.revoked = revoked
+
+
+def _aware(dt: Optional[datetime]) -> Optional[datetime]:
+    # SQLite drops tzinfo; stored expiries are UTC
+    return dt.replace(tzinfo=timezone.utc) if dt is not None and dt.tzinfo is None else dt
+
+
+class TokenCipher:
+    """
+    Encrypts tokens at rest with Fernet (AES-128-CBC + HMAC).
+
+    Encrypted values carry a ``fernet:`` prefix; anything else is a legacy
+    plaintext token and is returned as is (it is encrypted on its next write).
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        logger = logging.getLogger("token_store")
+        key = key or TOKEN_ENCRYPTION_KEY
+        if not key:
+            secret = os.getenv("SECRET_KEY")
+            if not secret:
+                logger.warning("Neither TOKEN_ENCRYPTION_KEY nor SECRET_KEY is set; stored OAuth tokens won't survive a restart")
+                secret = secrets.token_urlsafe(32)
+            key = base64.urlsafe_b64encode(hashlib.sha256(b"brody-oauth-tokens:" + secret.encode()).digest()).decode()
+        self._fernet = Fernet(key.encode() if isinstance(key, str) else key) if Fernet else None
+        if self._fernet is None:
+            logger.warning("cryptography not installed; OAuth tokens are stored unencrypted")
+
+    def encrypt(self, value: Optional[str]) -> Optional[str]:
+        if value is None or self._fernet is None:
+            return value
+        return _PREFIX + self._fernet.encrypt(value.encode("utf-8")).decode("ascii")
+
+    def decrypt(self, value: Optional[str]) -> Optional[str]:
+        if not value or not value.startswith(_PREFIX):
+            return value
+        if self._fernet is None:
+            return None
+        try:
+            return self._fernet.decrypt(value[len(_PREFIX):].encode("ascii")).decode("utf-8")
+        except InvalidToken:
+            logging.getLogger("token_store").warning("Stored token could not be decrypted (encryption key changed?)")
+            return None
+
+
+class Credentials:
+    __slots__ = ("access_token", "refresh_token", "expiry")
+
+    def __init__(self, access_token: Optional[str], refresh_token: Optional[str], expiry: Optional[datetime]):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expiry = _aware(expiry)
+
+    def valid_for(self, margin: timedelta) -> bool:
+        if not self.access_token:
+            return False
+        return self.expiry is None or self.expiry - datetime.now(timezone.utc) > margin
+
+
+class TokenStore:
+    """
+    OAuth credentials for linked accounts, encrypted in EmailAccount.
+
+    Decrypted credentials are cached in memory per account. A background
+    refresher renews tokens OAUTH_REFRESH_AHEAD seconds before they expire,
+    at most OAUTH_REFRESH_BATCH per scan with OAUTH_REFRESH_CONCURRENCY
+    requests in flight, so callers of ``access_token`` normally never wait on
+    Google. With several workers only the lease holder runs the refresher;
+    the others pick renewed tokens up from the database.
+    """
+
+    def __init__(self, session_factory=None, account_model=None, cipher: Optional[TokenCipher] = None, http_client=None):
+        self._session_factory = session_factory
+        self._model = account_model
+        self.cipher = cipher or TokenCipher()
+        self._http = http_client
+        self._owns_http = http_client is None
+        self._cache: Dict[str, Credentials] = {}
+        self._account_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counts = {"refreshed": 0, "inline_refreshes": 0, "failed": 0, "revoked": 0}
+        self._logger = logging.getLogger("token_store")
+
+    @property
+    def http(self):
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.Client(timeout=httpx.Timeout(OAUTH_TIMEOUT, connect=5.0),
+                                      limits=httpx.Limits(max_connections=OAUTH_REFRESH_CONCURRENCY * 2))
+        return self._http
+
+    def available(self) -> bool:
+        return self._session_factory is not None and self._model is not None
+
+    def _session(self):
+        session = self._session_factory()
+        if not self._table_ready:
+            from database import ensure_table
+
+            ensure_table(self._model.__table__, session.get_bind())
+            self._table_ready = True
+        return session
+
+    def _account_lock(self, account_id: str) -> threading.Lock:
+        with self._lock:
+            return self._account_locks.setdefault(account_id, threading.Lock())
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    # Storage -------------------------------------------------------------
+
+    def save(self, user_id: str, provider: str, email_address: str, access_token: str,
+             refresh_token: Optional[str], expiry: Optional[datetime]) -> str:
+        """Create or update the user's account row with fresh credentials; returns its id."""
+        model = self._model
+        session = self._session()
+        try:
+            account = session.query(model).filter(
+                model.user_id == user_id, model.provider == provider, model.email_address == email_address
+            ).first()
+            if account is None:
+                account = model(user_id=user_id, provider=provider, email_address=email_address)
+                session.add(account)
+            account.access_token = self.cipher.encrypt(access_token)
+            # Google only returns a refresh token on first consent; keep the old one otherwise
+            if refresh_token:
+                account.refresh_token = self.cipher.encrypt(refresh_token)
+            account.token_expiry = expiry
+            account.is_active = True
+            session.commit()
+            account_id = account.id
+            stored_refresh = self.cipher.decrypt(account.refresh_token)
+        finally:
+            session.close()
+        with self._lock:
+            self._cache[account_id] = Credentials(access_token, stored_refresh, expiry)
+        return account_id
+
+    def _load(self, account_id: str) -> Optional[Credentials]:
+        session = self._session()
+        try:
+            account = session.get(self._model, account_id)
+            if account is None or not account.is_active:
+                return None
+            creds = Credentials(self.cipher.decrypt(account.access_token), self.cipher.decrypt(account.refresh_token),
+                                account.token_expiry)
+        finally:
+            session.close()
+        with self._lock:
+            self._cache[account_id] = creds
+        return creds
+
+    def invalidate(self, account_id: str) -> None:
+        with self._lock:
+            self._cache.pop(account_id, None)
+
+    # Access --------------------------------------------------------------
+
+    def access_token(self, account_id: str) -> str:
+        """A currently valid access token; refreshes inline only if the refresher fell behind."""
+        creds = self._cache.get(account_id) or self._load(account_id)
+        if creds is None:
+            raise TokenRefreshError(f"No active credentials for account {account_id}")
+        if creds.valid_for(_MIN_VALIDITY):
+            return creds.access_token
+        with self._account_lock(account_id):
+            # Another thread or worker may have refreshed while we waited
+            creds = self._load(account_id)
+            if creds is None:
+                raise TokenRefreshError(f"No active credentials for account {account_id}")
+            if creds.valid_for(_MIN_VALIDITY):
+                return creds.access_token
+            self._count("inline_refreshes")
+            return self._refresh_locked(account_id, creds).access_token
+
+    def refresh(self, account_id: str) -> Credentials:
+        """Force a refresh (e.g. after a 401)."""
+        with self._account_lock(account_id):
+            creds = self._load(account_id)
+            if creds is None:
+                raise TokenRefreshError(f"No active credentials for account {account_id}")
+            return self._refresh_locked(account_id, creds)
+
+    def _refresh_locked(self, account_id: str, creds: Credentials) -> Credentials:
+        if not creds.refresh_token:
+            raise TokenRefreshError(f"Account {account_id} has no refresh token")
+        resp = self.http.post(GOOGLE_TOKEN_URI, data={
+            "grant_type": "refresh_token",
+            "refresh_token": creds.refresh_token,
+            "client_id": GOOGLE_CLIENT_ID or "",
+            "client_secret": GOOGLE_CLIENT_SECRET or "",
+        })
+        if resp.status_code >= 400:
+            self._count("failed")
+            try:
+                error = resp.json().get("error")
+            except ValueError:
+                error = None
+            if error == "invalid_grant":
+                # Revoked or expired consent: stop using the account until the user relinks it
+                self._deactivate(account_id)
+                raise TokenRefreshError(f"Refresh token for account {account_id} was revoked", revoked=True)
+            raise TokenRefreshError(f"Token refresh failed ({resp.status_code}): {resp.text[:200]}")
+        data = resp.json()
+        fresh = Credentials(data["access_token"], data.get("refresh_token") or creds.refresh_token,
+                            datetime.now(timezone.utc) + timedelta(seconds=int(data.get("expires_in", 3600))))
+        session = self._session()
+        try:
+            account = session.get(self._model, account_id)
+            if account is not None:
+                account.access_token = self.cipher.encrypt(fresh.access_token)
+                if data.get("refresh_token"):
+                    account.refresh_token = self.cipher.encrypt(fresh.refresh_token)
+                account.token_expiry = fresh.expiry
+                session.commit()
+        finally:
+            session.close()
+        with self._lock:
+            self._cache[account_id] = fresh
+        self._count("refreshed")
+        return fresh
+
+    def _deactivate(self, account_id: str) -> None:
+        self._count("revoked")
+        self.invalidate(account_id)
+        session = self._session()
+        try:
+            account = session.get(self._model, account_id)
+            if account is not None:
+                account.is_active = False
+                session.commit()
+        finally:
+            session.close()
+
+    # Background refresher --------------------------------------------------
+
+    def due_accounts(self, limit: int = OAUTH_REFRESH_BATCH) -> List[str]:
+        """Active accounts whose token expires within OAUTH_REFRESH_AHEAD, soonest first."""
+        model = self._model
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=OAUTH_REFRESH_AHEAD)
+        session = self._session()
+        try:
+            rows = session.query(model.id).filter(
+                model.is_active.is_(True), model.refresh_token.isnot(None),
+                model.token_expiry.isnot(None), model.token_expiry <= horizon,
+            ).order_by(model.token_expiry).limit(limit)
+            return [row.id for row in rows]
+        finally:
+            session.close()
+
+    def refresh_due(self) -> int:
+        """Refresh one bounded batch of soon-to-expire tokens; returns how many succeeded."""
+        due = self.due_accounts()
+        if not due:
+            return 0
+
+        def one(account_id: str) -> bool:
+            try:
+                with self._account_lock(account_id):
+                    creds = self._load(account_id)
+                    if creds is None or creds.valid_for(timedelta(seconds=OAUTH_REFRESH_AHEAD)):
+                        return False
+                    self._refresh_locked(account_id, creds)
+                return True
+            except Exception as e:
+                self._logger.warning(f"Background refresh failed for account {account_id}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=OAUTH_REFRESH_CONCURRENCY, thread_name_prefix="oauth-refresh") as pool:
+            return sum(pool.map(one, due))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if shared_state.acquire_lease("oauth-refresher", OAUTH_REFRESH_INTERVAL * 3):
+                    refreshed = self.refresh_due()
+                    if refreshed:
+                        self._logger.info(f"Refreshed {refreshed} OAuth token(s)")
+            except Exception as e:
+                self._logger.warning(f"Token refresh scan failed: {e}")
+            self._stop.wait(OAUTH_REFRESH_INTERVAL)
+
+    def start(self) -> None:
+        if self._thread is not None or not self.available():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="oauth-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            try:
+                shared_state.release_lease("oauth-refresher")
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self.stop()
+        if self._owns_http and self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, "cached": len(self._cache), "refresher_running": self._thread is not None}
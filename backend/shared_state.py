@@ -0,0 +1,218 @@
+"""
+Cross-process state for multi-worker deployments
+
+A single SQLite database in WAL mode shared by every worker on the host. It
+holds the LLM response cache, provider rate-limit buckets, leases (single
+leader for background schedulers, single flight for identical LLM calls)
+and the import job queue. Each thread keeps its own connection.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "./brody_state.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, owner TEXT,
+    data TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (kind, status, created_at);
+"""
+
+
+class SharedState:
+    """SQLite-backed store; safe to use from many threads and processes."""
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        # Unique per process; identifies lease and job owners
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: explicit BEGIN IMMEDIATE where read-modify-write must be atomic
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Immediate(self._conn())
+
+    # Cache ---------------------------------------------------------------
+
+    def cache_get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def cache_set(self, key: str, value: Any, ttl: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,)).rowcount
+        conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        return removed
+
+    # Leases --------------------------------------------------------------
+
+    def acquire_lease(self, name: str, ttl: float, owner: Optional[str] = None) -> bool:
+        """Take or renew ``name`` for ``ttl`` seconds; False if another live owner holds it."""
+        owner = owner or self.owner
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            return True
+
+    def release_lease(self, name: str, owner: Optional[str] = None) -> None:
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner or self.owner))
+
+    # Rate limiting -------------------------------------------------------
+
+    def take_token(self, name: str, rate: float, burst: float) -> float:
+        """
+        Token bucket shared by all workers.
+
+        Returns 0.0 when a token was taken, otherwise the seconds to wait
+        before one becomes available (nothing is consumed in that case).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            if tokens >= 1.0:
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (name, tokens - 1.0, now),
+                )
+                return 0.0
+            return (1.0 - tokens) / rate if rate > 0 else 1.0
+
+    # Jobs ----------------------------------------------------------------
+
+    def job_put(self, job_id: str, kind: str, data: Dict[str, Any], status: str = "queued") -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (id, kind, status, owner, data, created_at, updated_at) VALUES (?, ?, ?, NULL, ?, ?, ?)",
+            (job_id, kind, status, json.dumps(data), now, now),
+        )
+
+    def job_update(self, job_id: str, data: Dict[str, Any], status: Optional[str] = None) -> bool:
+        """Save a job this process has claimed; False once another process has reclaimed it."""
+        if status is None:
+            cur = self._conn().execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(data), time.time(), job_id, self.owner),
+            )
+        else:
+            cur = self._conn().execute(
+                "UPDATE jobs SET data = ?, status = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(data), status, time.time(), job_id, self.owner),
+            )
+        return cur.rowcount > 0
+
+    def job_get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT status, data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[1]), "status": row[0]}
+
+    def job_claim(self, kind: str, stale_after: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Atomically move the oldest queued job of ``kind`` to running for this process.
+
+        With ``stale_after``, a running job whose ``updated_at`` is older than that
+        many seconds (its worker died mid-job) is reclaimed as well.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if stale_after is None:
+                row = conn.execute(
+                    "SELECT id, data FROM jobs WHERE kind = ? AND status = 'queued' ORDER BY created_at LIMIT 1", (kind,)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT id, data FROM jobs WHERE kind = ? AND (status = 'queued' OR (status = 'running' AND updated_at < ?))"
+                    " ORDER BY created_at LIMIT 1", (kind, now - stale_after)
+                ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, updated_at = ? WHERE id = ?",
+                (self.owner, now, row[0]),
+            )
+        return {**json.loads(row[1]), "id": row[0], "status": "running"}
+
+
+class _Immediate:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` (or ``ROLLBACK`` on error) around a block."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class RateLimiter:
+    """Blocking wrapper over a shared token bucket."""
+
+    def __init__(self, state: SharedState, name: str, rate: float, burst: float):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    def acquire(self, timeout: float = 30.0) -> bool:
+        """Wait for a token; False if none became available within ``timeout``."""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                wait = self.state.take_token(self.name, self.rate, self.burst)
+            except sqlite3.Error:
+                return True  # fail open: a broken state file must not stop all AI traffic
+            if wait <= 0:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+
+
+shared_state = SharedState()
@@ -9,6 +9,30 @@ if [ "$DATABASE_URL" ]; then
     python3 -c "from database import Base, engine; Base.metadata.create_all(engine)" || echo "⚠️  Database initialization skipped (may already exist)"
 fi
 
+# Worker processes (WEB_CONCURRENCY or --workers N). Workers share the LLM cache,
+# rate-limit buckets and import job queue through SHARED_STATE_PATH (SQLite WAL).
+WORKERS=${WEB_CONCURRENCY:-1}
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --workers) WORKERS="$2"; shift 2 ;;
+        --workers=*) WORKERS="${1#*=}"; shift ;;
+        *) echo "Unknown option: $1"; exit 1 ;;
+    esac
+done
+if [ "$WORKERS" -gt 1 ]; then
+    # Keep per-worker process pools from oversubscribing the CPUs
+    export PARSE_POOL_WORKERS=${PARSE_POOL_WORKERS:-1}
+    # Every worker must sign and verify JWTs with the same key
+    if [ -z "$SECRET_KEY" ]; then
+        echo "⚠️  SECRET_KEY not set; generating one shared by this run's workers (tokens reset on restart)"
+        export SECRET_KEY=$(python3 -c "import secrets; print(secrets.token_urlsafe(32))")
+    fi
+fi
+
 # Start the server
-echo "🌐 Starting FastAPI server on 0.0.0.0:${PORT:-9000}..."
-exec python3 -m uvicorn main:app --host 0.0.0.0 --port ${PORT:-9000} --log-level info
+echo "🌐 Starting FastAPI server on 0.0.0.0:${PORT:-9000} with $WORKERS worker(s)..."
+if [ "$WORKERS" -gt 1 ] && python3 -c "import gunicorn" 2>/dev/null; then
+    exec python3 -m gunicorn main:app -k uvicorn.workers.UvicornWorker -w "$WORKERS" \
+        --bind 0.0.0.0:${PORT:-9000} --log-level info
+fi
+exec python3 -m uvicorn main:app --host 0.0.0.0 --port ${PORT:-9000} --workers "$WORKERS" --log-level info